@@ -0,0 +1,43 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Dictionary with a maximum number of entries, when it is full the least recently used entry is removed
+    hits and misses are counted so the capacity can be tuned
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+
+    def get(self, key):
+        """
+        returns the value of the key, or None if the key is not in the cache
+        """
+        value = self.__entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.__entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+        self.__entries[key] = value
+        self.__entries.move_to_end(key)
+        if len(self.__entries) > self.capacity:
+            self.__entries.popitem(last=False)
+
+    @property
+    def size(self):
+        return len(self.__entries)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
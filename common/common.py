@@ -1,10 +1,17 @@
+import hashlib
+import io
 import logging
 
 import chess
 
+from common.pgn_reader import open_compressed
+
 log = logging.getLogger("pgn2data - common")
 logging.basicConfig(level=logging.INFO)
 
+# the output files are written to disk in blocks of this size
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
 piece_fen_letter_to_chess_piece = {
     "p": chess.PAWN,
     "q": chess.QUEEN,
@@ -52,14 +59,68 @@ board_reference = {
 def full_range(start, stop): return range(start, stop + 1)
 
 
-def open_file(file_name):
+def open_file(file_name, mode='w', compression=None, buffer_size=DEFAULT_BUFFER_SIZE):
+    """
+    opens a text file, compression is the extension of the compression of the file (".gz", ".bz2", ".xz" or ".zst")
+    or None if the file is not compressed
+    """
     try:
-        return open(file_name, mode='w', newline='', encoding="utf-8")
+        if compression is None:
+            return open(file_name, mode=mode, newline='', encoding="utf-8", buffering=buffer_size)
+        return CompressedTextFile(file_name, mode, compression, buffer_size)
     except PermissionError:
         log.error("Could not access the file: {}".format(file_name))
         return None
 
 
+class CompressedTextFile(io.TextIOWrapper):
+    """
+    Text file that is compressed as it is written, or decompressed as it is read
+    the compressed data is written to the file in blocks of buffer_size bytes
+    """
+
+    def __init__(self, file_name, mode, compression, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.__file_name = file_name
+        self.__file = open(file_name, mode=mode + 'b', buffering=buffer_size)
+        try:
+            super().__init__(open_compressed(self.__file, compression, mode), newline='', encoding="utf-8")
+        except Exception:
+            self.__file.close()
+            raise
+
+    @property
+    def name(self):
+        return self.__file_name
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            # the compressed stream does not close the file it writes to
+            self.__file.close()
+
+
+def add_statistics(total, statistics):
+    """
+    adds the counters in the dictionary statistics to the dictionary total
+    counters can be grouped in nested dictionaries
+    """
+    for key, value in statistics.items():
+        if isinstance(value, dict):
+            add_statistics(total.setdefault(key, {}), value)
+        else:
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+def get_hash_key(text):
+    """
+    returns a 63 bit integer from the hash of the text, so it is a positive number in a signed 64 bit column
+    """
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1
+
+
 def seconds_to_text(secs):
     days = secs // 86400
     hours = (secs - days * 86400) // 3600
@@ -1,5 +1,6 @@
 from timeit import default_timer as timer
 from common.common import seconds_to_text
+from contextlib import nullcontext
 from datetime import datetime
 import logging
 
@@ -33,3 +34,56 @@ class TimeProcess:
         log.info("time taken: " + str(seconds_to_text(lapsed_time_seconds)))
         log.info("time started..." + str(self.time_started))
         log.info("time ended....." + str(datetime.utcnow()))
+
+
+class StageTimer:
+    """
+    Cumulative time taken and number of calls of each stage of the conversion
+    usage: with stage_timer.time("stage name"): ...
+    When it is not enabled nothing is timed, and the cost is a method call for each stage
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.timings = {}
+
+    def time(self, stage):
+        return _StageTime(self.timings, stage) if self.enabled else _no_stage_time
+
+    def get_statistics(self):
+        """
+        returns a dictionary of stage: {"seconds": total time, "count": number of calls}
+        """
+        return {stage: {"seconds": timing[0], "count": timing[1]} for stage, timing in self.timings.items()}
+
+
+class _StageTime:
+
+    def __init__(self, timings, stage):
+        self.timings = timings
+        self.stage = stage
+        self.start = 0
+
+    def __enter__(self):
+        self.start = timer()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        timing = self.timings.get(self.stage)
+        if timing is None:
+            timing = self.timings[self.stage] = [0.0, 0]
+        timing[0] += timer() - self.start
+        timing[1] += 1
+
+
+_no_stage_time = nullcontext()
+
+
+def print_stage_timings(stage_timings):
+    """
+    logs the stages from the slowest to the fastest
+    """
+    total_seconds = sum(timing["seconds"] for timing in stage_timings.values())
+    for stage, timing in sorted(stage_timings.items(), key=lambda item: item[1]["seconds"], reverse=True):
+        log.info("stage {:<16} {:>10.3f} sec {:>6.1%} | calls: {:>10} | {:>8.1f} us per call".format(
+            stage, timing["seconds"], timing["seconds"] / total_seconds if total_seconds > 0 else 0,
+            timing["count"], timing["seconds"] * 1000000 / timing["count"] if timing["count"] > 0 else 0))
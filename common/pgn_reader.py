@@ -0,0 +1,269 @@
+import bz2
+import gzip
+import io
+import logging
+import lzma
+import ntpath
+import os.path
+import queue
+import re
+import threading
+
+log = logging.getLogger("pgn2data - pgn reader")
+logging.basicConfig(level=logging.INFO)
+
+# a game starts with an event tag at the start of a line, after an empty line
+GAME_START_PATTERN = re.compile(rb"\n[ \t\r]*\n(\[Event )")
+GAME_START_SEARCH_SIZE = 1024 * 1024
+
+# compressed pgn files are decompressed on a separate thread in chunks of this size
+DECOMPRESS_CHUNK_SIZE = 1024 * 1024
+DECOMPRESS_QUEUE_SIZE = 16
+
+compression_extensions = [".bz2", ".gz", ".xz", ".zst"]
+
+# gzip compresses much faster at this level than at its default of 9, and the files are only slightly larger
+GZIP_COMPRESS_LEVEL = 6
+
+
+class RangeReader(io.RawIOBase):
+    """
+    Reads a byte range of a file, the end of the range is reported as the end of the file
+    tell() and seek() use the byte positions of the whole file, the position is tracked as the range is read
+    so tell() does not ask the file for it
+    """
+
+    def __init__(self, file_name, start, end):
+        self.raw = open(file_name, mode='rb')
+        self.end = end
+        self.position = self.raw.seek(start)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        remaining = self.end - self.position
+        if remaining <= 0:
+            return 0
+        view = memoryview(buffer)
+        size = self.raw.readinto(view[:min(len(view), remaining)])
+        self.position += size
+        return size
+
+    def tell(self):
+        return self.position
+
+    def seek(self, position, whence=io.SEEK_SET):
+        self.position = self.raw.seek(position, whence)
+        return self.position
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+class DecompressReader(io.RawIOBase):
+    """
+    Reads a compressed pgn file, which is decompressed on a separate thread while the games are parsed
+    start and end are positions in the decompressed data, the data before start is decompressed and skipped
+    tell() is the position in the decompressed data, and compressed_position is the position in the file
+    """
+
+    def __init__(self, file_name, start=0, end=None):
+        self.file_name = file_name
+        self.end = end
+        self.position = start
+        self.compressed_position = 0
+        self.__chunk = b""
+        self.__chunk_offset = 0
+        self.__is_end = False
+        self.__chunks = queue.Queue(maxsize=DECOMPRESS_QUEUE_SIZE)
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(target=self.__decompress, args=(start,), daemon=True)
+        self.__thread.start()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        # this is needed for tell(), only seeking to the current position is supported
+        return True
+
+    def readinto(self, buffer):
+        while self.__chunk_offset >= len(self.__chunk):
+            if self.__is_end:
+                return 0
+            chunk = self.__chunks.get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            if len(chunk) == 0:
+                self.__is_end = True
+                return 0
+            self.__chunk, self.__chunk_offset = chunk, 0
+        size = min(len(buffer), len(self.__chunk) - self.__chunk_offset)
+        if self.end is not None:
+            size = min(size, self.end - self.position)
+            if size <= 0:
+                return 0
+        buffer[:size] = self.__chunk[self.__chunk_offset:self.__chunk_offset + size]
+        self.__chunk_offset += size
+        self.position += size
+        return size
+
+    def tell(self):
+        return self.position
+
+    def seek(self, position, whence=io.SEEK_SET):
+        if (whence == io.SEEK_SET and position == self.position) or (whence == io.SEEK_CUR and position == 0):
+            return self.position
+        raise io.UnsupportedOperation("compressed pgn files can only be read from the start")
+
+    def close(self):
+        self.__stopped.set()
+        # the queue is emptied so the thread is not left waiting to add a chunk
+        while self.__thread.is_alive():
+            try:
+                self.__chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        super().close()
+
+    def __decompress(self, start):
+        try:
+            compression = get_compression(self.file_name)
+            with open(self.file_name, mode='rb') as raw, open_compressed(raw, compression) as file:
+                skip = start
+                while not self.__stopped.is_set():
+                    chunk = file.read(min(DECOMPRESS_CHUNK_SIZE, skip) if skip > 0 else DECOMPRESS_CHUNK_SIZE)
+                    self.compressed_position = raw.tell()
+                    if skip > 0 and len(chunk) > 0:
+                        skip -= len(chunk)
+                        continue
+                    self.__put(chunk)
+                    if len(chunk) == 0:
+                        break
+        except Exception as ex:
+            self.__put(ex)
+
+    def __put(self, chunk):
+        while not self.__stopped.is_set():
+            try:
+                self.__chunks.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+
+def get_compression(file_name):
+    """
+    returns the extension of a compressed file, or None if the file is not compressed
+    """
+    for extension in compression_extensions:
+        if file_name.lower().endswith(extension):
+            return extension
+    return None
+
+
+def is_compressed(file_name):
+    return get_compression(file_name) is not None
+
+
+def open_compressed(file, compression, mode='r'):
+    """
+    returns a binary file object of the decompressed data read from the file object file,
+    or that compresses the data written to it when mode is 'w'
+    compression is the extension of the compression (".gz", ".bz2", ".xz" or ".zst")
+    """
+    if compression == ".gz":
+        return gzip.GzipFile(fileobj=file, mode=mode + 'b', compresslevel=GZIP_COMPRESS_LEVEL)
+    if compression == ".bz2":
+        return bz2.BZ2File(file, mode=mode)
+    if compression == ".xz":
+        return lzma.LZMAFile(file, mode=mode)
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstandard needs to be installed to use .zst files: pip install zstandard")
+    if mode == 'r':
+        return zstandard.ZstdDecompressor().stream_reader(file, read_across_frames=True)
+    return zstandard.ZstdCompressor().stream_writer(file)
+
+
+def get_pgn_file_name(file_name):
+    """
+    returns the name of the pgn file without its folder or the extension of its compression
+    """
+    name = ntpath.basename(file_name)
+    compression = get_compression(name)
+    return name[:-len(compression)] if compression is not None else name
+
+
+def open_pgn(file_name, start=0, end=None):
+    """
+    opens a pgn file in text mode, or only the byte range between start and end
+    compressed files are decompressed as they are read, start and end are then positions in the decompressed data
+    """
+    if is_compressed(file_name):
+        return io.TextIOWrapper(io.BufferedReader(DecompressReader(file_name, start, end)), encoding="UTF-8")
+    if start == 0 and end is None:
+        return open(file_name, encoding="UTF-8")
+    end = os.path.getsize(file_name) if end is None else end
+    return io.TextIOWrapper(io.BufferedReader(RangeReader(file_name, start, end)), encoding="UTF-8")
+
+
+def get_game_ranges(file_name, parts):
+    """
+    splits a pgn file into a number of byte ranges of roughly the same size
+    each range starts at the beginning of a game, so it can be parsed on its own
+    returns a list of tuples: (start, end)
+    """
+    size = os.path.getsize(file_name)
+    starts = [0]
+    with open(file_name, mode='rb') as pgn:
+        for part in range(1, parts):
+            start = find_game_start(pgn, max(size * part // parts, starts[-1] + 1))
+            if start is None:
+                break
+            if start > starts[-1]:
+                starts.append(start)
+    ends = starts[1:] + [size]
+    return list(zip(starts, ends))
+
+
+def find_game_start(pgn, position):
+    """
+    returns the position of the first game starting at or after the position in a file opened in binary mode,
+    or None if there is no game after it
+    """
+    # step back so an empty line just before the position is found
+    offset = max(position - 4, 0)
+    pgn.seek(offset)
+    chunk = b""
+    while True:
+        data = pgn.read(GAME_START_SEARCH_SIZE)
+        if not data:
+            return None
+        chunk += data
+        match = GAME_START_PATTERN.search(chunk)
+        while match is not None and offset + match.start(1) < position:
+            match = GAME_START_PATTERN.search(chunk, match.start(1))
+        if match is not None:
+            return offset + match.start(1)
+        # keep the end of the chunk in case a game start is split across two reads
+        tail = chunk[-16:]
+        offset += len(chunk) - len(tail)
+        chunk = tail
+
+
+def get_read_position(pgn):
+    """
+    returns the byte position read so far in a pgn file opened with open_pgn
+    this is ahead of the position of the text by up to the size of the buffer, but unlike tell() it is cheap
+    for compressed files this is the position in the compressed file
+    """
+    if isinstance(pgn.buffer.raw, DecompressReader):
+        return pgn.buffer.raw.compressed_position
+    return pgn.buffer.tell()
@@ -0,0 +1,62 @@
+import json
+import logging
+import os.path
+
+log = logging.getLogger("pgn2data - checkpoint")
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_CHECKPOINT_INTERVAL = 300
+
+
+class Checkpoint:
+    """
+    Records how far an export has got, so it can be resumed after a crash or being killed
+    The checkpoint is saved in a JSON file next to the output files, it has:
+        file_index - index in the list of pgn files of the file being converted
+        offset - byte position in that file of the next game to convert
+        game_order - game order of the next game
+        games_size, moves_size - size of the output files when all the games before the offset were written
+        statistics - counters of the pgn files already converted
+        columns - state of the column trackers when empty columns are removed at the end
+    pgn_files and options are the inputs of the export, a checkpoint is only used by an export with the same inputs
+    """
+
+    def __init__(self, file_name, pgn_files, options):
+        self.file_name = file_name
+        self.pgn_files = [os.path.abspath(pgn_file) for pgn_file in pgn_files]
+        # the options are compared with the options loaded from the file, so they are stored as they would be loaded
+        self.options = json.loads(json.dumps(options))
+
+    def save(self, file_index, offset, game_order, games_size, moves_size, statistics, columns=None):
+        data = {"pgn_files": self.pgn_files,
+                "options": self.options,
+                "file_index": file_index,
+                "offset": offset,
+                "game_order": game_order,
+                "games_size": games_size,
+                "moves_size": moves_size,
+                "statistics": statistics,
+                "columns": columns if columns is not None else {}}
+        # the file is replaced in one step, so a crash while it is written does not lose the previous checkpoint
+        temp_file_name = self.file_name + ".tmp"
+        with open(temp_file_name, mode='w', encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(temp_file_name, self.file_name)
+
+    def load(self):
+        """
+        returns the saved checkpoint as a dictionary, or None if there is no checkpoint
+        raises ValueError if the checkpoint was saved by an export with different inputs
+        """
+        if not os.path.isfile(self.file_name):
+            return None
+        with open(self.file_name, encoding="utf-8") as file:
+            data = json.load(file)
+        if data["pgn_files"] != self.pgn_files or data["options"] != self.options:
+            raise ValueError("The checkpoint {} was saved by an export of different pgn files or options, "
+                             "remove it to start the export again".format(self.file_name))
+        return data
+
+    def remove(self):
+        if os.path.isfile(self.file_name):
+            os.remove(self.file_name)
@@ -0,0 +1,68 @@
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import chess
+import chess.engine
+
+log = logging.getLogger("pgn2data - engine")
+logging.basicConfig(level=logging.INFO)
+
+
+class EnginePool:
+    """
+    Pool of UCI engines used to evaluate the positions of a game
+    With one engine the positions are evaluated one after another, as the engine was used before.
+    With more engines the positions are evaluated concurrently, and each position is analysed as a new game,
+    so the evaluation does not depend on which positions an engine analysed before it.
+    If an EvaluationCache is given, it is checked before a position is sent to an engine.
+    """
+
+    def __init__(self, engine_path, size=1, cache=None):
+        self.size = size
+        self.cache = cache
+        self.engines = queue.Queue()
+        for _ in range(size):
+            self.engines.put(chess.engine.SimpleEngine.popen_uci(engine_path))
+        self.executor = ThreadPoolExecutor(max_workers=size) if size > 1 else None
+
+    def evaluate_positions(self, boards, depth):
+        """
+        returns the score of each board, in the same order as the boards
+        """
+        if self.executor is None:
+            return [self.evaluate(board, depth) for board in boards]
+        return list(self.executor.map(lambda board: self.evaluate(board, depth), boards))
+
+    def evaluate(self, board, depth):
+        """
+        returns the score of the board as a PovScore, or None if the engine could not analyse it
+        """
+        if self.cache is not None:
+            pov_score = self.cache.get(board, depth)
+            if pov_score is not None:
+                return pov_score
+
+        engine = self.engines.get()
+        try:
+            # a new game object makes the engine clear its state before the analysis
+            game = object() if self.size > 1 else None
+            info = engine.analyse(board, chess.engine.Limit(depth=depth), game=game)
+            pov_score = info["score"]
+        except Exception as ex:
+            log.error(ex)
+            return None
+        finally:
+            self.engines.put(engine)
+
+        if self.cache is not None:
+            self.cache.put(board, depth, pov_score)
+        return pov_score
+
+    def quit(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+        while not self.engines.empty():
+            self.engines.get().quit()
+        if self.cache is not None:
+            self.cache.close()
@@ -0,0 +1,103 @@
+import logging
+import sqlite3
+import threading
+import time
+
+import chess
+import chess.engine
+
+log = logging.getLogger("pgn2data - eval cache")
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_EVAL_CACHE_SIZE = 10000000
+
+
+class EvaluationCache:
+    """
+    Persistent cache of engine evaluations stored in a SQLite file
+    Positions are keyed by the EPD of the board (pieces, side to move, castling and en passant) and the depth.
+    Scores are stored from white's point of view.
+    When the cache has more than max_size positions, the least recently used positions are removed.
+    """
+
+    # number of changes made before they are committed to the file
+    COMMIT_SIZE = 1000
+
+    def __init__(self, path, max_size=DEFAULT_EVAL_CACHE_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+        self.__pending_changes = 0
+        self.__used_keys = []
+        self.__connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("CREATE TABLE IF NOT EXISTS evaluations (position TEXT NOT NULL, "
+                                  "depth INTEGER NOT NULL, cp INTEGER, mate INTEGER, last_used REAL NOT NULL, "
+                                  "PRIMARY KEY (position, depth)) WITHOUT ROWID")
+        self.__connection.execute("CREATE INDEX IF NOT EXISTS evaluations_last_used ON evaluations (last_used)")
+        self.__connection.commit()
+        self.__size = self.__connection.execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+
+    def get(self, board, depth):
+        """
+        returns the cached PovScore of the board, or None if it has not been evaluated at this depth
+        """
+        key = (board.epd(), depth)
+        with self.__lock:
+            row = self.__connection.execute("SELECT cp, mate FROM evaluations WHERE position = ? AND depth = ?",
+                                            key).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # the time a position was last used is updated in batches with the other changes
+            self.__used_keys.append(key)
+            self.__add_change()
+        cp, mate = row
+        score = chess.engine.Mate(mate) if mate is not None else chess.engine.Cp(cp)
+        return chess.engine.PovScore(score, chess.WHITE)
+
+    def put(self, board, depth, pov_score):
+        white_score = pov_score.white()
+        cp = white_score.score()
+        mate = white_score.mate()
+        with self.__lock:
+            cursor = self.__connection.execute("INSERT OR IGNORE INTO evaluations VALUES (?, ?, ?, ?, ?)",
+                                               (board.epd(), depth, cp, mate, time.time()))
+            self.__size += cursor.rowcount
+            if self.__size > self.max_size:
+                self.__commit()
+            else:
+                self.__add_change()
+
+    def close(self):
+        with self.__lock:
+            self.__commit()
+        self.__connection.close()
+
+    def __add_change(self):
+        self.__pending_changes += 1
+        if self.__pending_changes >= self.COMMIT_SIZE:
+            self.__commit()
+
+    def __commit(self):
+        now = time.time()
+        self.__connection.executemany("UPDATE evaluations SET last_used = ? WHERE position = ? AND depth = ?",
+                                      [(now, position, depth) for position, depth in self.__used_keys])
+        self.__used_keys = []
+        if self.__size > self.max_size:
+            self.__evict()
+        self.__connection.commit()
+        self.__pending_changes = 0
+
+    def __evict(self):
+        """
+        removes the least recently used positions, plus a margin so this does not run on every commit
+        """
+        excess = self.__size - self.max_size + self.max_size // 10
+        self.__connection.execute("DELETE FROM evaluations WHERE last_used <= (SELECT last_used FROM evaluations "
+                                  "ORDER BY last_used LIMIT 1 OFFSET ?)", (excess - 1,))
+        self.__size = self.__connection.execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+        log.debug("evaluation cache reduced to {} positions".format(self.__size))
@@ -2,21 +2,39 @@ from collections import Counter
 import chess
 import logging
 
-from common.common import piece_fen_letters, piece_fen_count, piece_fen_value, full_range, piece_fen_letter_to_chess_piece
+from common.common import piece_fen_letters, piece_fen_count, piece_fen_value, piece_fen_letter_to_chess_piece
 
 log = logging.getLogger("pgn2data - fen")
 logging.basicConfig(level=logging.INFO)
 
 
+# fen letter: (index of the count in a fen row tuple, value of the piece)
+fen_letter_row_valuation = {}
+for fen_letter, fen_piece in piece_fen_letter_to_chess_piece.items():
+    fen_letter_row_valuation[fen_letter.upper()] = (0, piece_fen_value[fen_piece])
+    fen_letter_row_valuation[fen_letter] = (2, piece_fen_value[fen_piece])
+
+
 class FenStats:
     """
     Handles all calculations performed on a fen position
+    The piece counts and fen row valuations are each calculated in one pass and then reused,
+    when created from a board the piece counts are taken from the board's bitboards
+    row_cache is an optional LRUCache of the valuation of each fen row, keyed by the fen row string
     """
     # total value of a player's pieces at start of game
     PIECE_VALUE_TOTAL = 39
 
-    def __init__(self, fen):
+    def __init__(self, fen, board=None, row_cache=None):
         self.fen_position = fen
+        self.__board = board
+        self.__row_cache = row_cache
+        self.__piece_counts = None
+        self.__fen_row_valuations = None
+
+    @staticmethod
+    def from_board(board, row_cache=None):
+        return FenStats(board.board_fen(), board, row_cache)
 
     @staticmethod
     def __is_valid_color(color):
@@ -30,6 +48,9 @@ class FenStats:
         """
         returns a tuple with the total number of white and black board
         """
+        if self.__board is not None:
+            return chess.popcount(self.__board.occupied_co[chess.WHITE]), \
+                chess.popcount(self.__board.occupied_co[chess.BLACK])
         pieces_to_count = [chess.PAWN, chess.QUEEN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.KING]
         white_total = 0
         black_total = 0
@@ -50,9 +71,25 @@ class FenStats:
         elif not self.__is_valid_color(color):
             log.error("invalid color parameter {}".format(str(color)))
             return 0
-        piece_letter = piece_fen_letters[piece].lower() if color == chess.BLACK else piece_fen_letters[piece].upper()
-        c = Counter(self.fen_position)
-        return c[piece_letter]
+        if self.__piece_counts is None:
+            self.__piece_counts = self.__get_piece_counts()
+        return self.__piece_counts[piece, color]
+
+    def __get_piece_counts(self):
+        """
+        returns a dictionary with the count of each piece: (piece, color) = count
+        """
+        piece_counts = {}
+        if self.__board is not None:
+            for piece in piece_fen_letters:
+                piece_counts[piece, chess.WHITE] = chess.popcount(self.__board.pieces_mask(piece, chess.WHITE))
+                piece_counts[piece, chess.BLACK] = chess.popcount(self.__board.pieces_mask(piece, chess.BLACK))
+        else:
+            c = Counter(self.fen_position)
+            for piece, piece_letter in piece_fen_letters.items():
+                piece_counts[piece, chess.WHITE] = c[piece_letter.upper()]
+                piece_counts[piece, chess.BLACK] = c[piece_letter.lower()]
+        return piece_counts
 
     def get_captured_score(self, color):
         """
@@ -64,11 +101,15 @@ class FenStats:
             log.error("invalid color parameter {}".format(str(color)))
             return 0
 
+        if self.__piece_counts is None:
+            self.__piece_counts = self.__get_piece_counts()
+
         captured_score = 0
         pieces_to_sum = [chess.PAWN, chess.QUEEN, chess.KNIGHT, chess.BISHOP, chess.ROOK]
+        opponent = chess.WHITE if color == chess.BLACK else chess.BLACK
         for piece in pieces_to_sum:
             count_at_start = piece_fen_count[piece]
-            count_at_position = self.get_piece_count(piece, chess.WHITE if color == chess.BLACK else chess.BLACK)
+            count_at_position = self.__piece_counts[piece, opponent]
             captured_score += (count_at_start - count_at_position) * piece_fen_value[piece]
         return captured_score
 
@@ -77,13 +118,38 @@ class FenStats:
         get row counts and evaluation for all fen rows
         returns a list with 8 tuples
         each tuple has 4 values:
-        white_cnt, black_cnt, white_val, black_val
+        white_cnt, white_val, black_cnt, black_val
+        """
+        if self.__fen_row_valuations is None:
+            self.__fen_row_valuations = self.__get_fen_row_valuations()
+        return self.__fen_row_valuations
+
+    def __get_fen_row_valuations(self):
+        """
+        goes through the fen string once, the first fen row is the last one in the string
         """
         results = []
-        for row in full_range(1, 8):
-            results.append(self.get_piece_count_and_value_for_fen_row(row))
+        for row_to_evaluate in reversed(self.fen_position.split("/")):
+            if self.__row_cache is not None:
+                valuation = self.__row_cache.get(row_to_evaluate)
+                if valuation is None:
+                    valuation = self.__get_fen_row_valuation(row_to_evaluate)
+                    self.__row_cache.put(row_to_evaluate, valuation)
+            else:
+                valuation = self.__get_fen_row_valuation(row_to_evaluate)
+            results.append(valuation)
         return results
 
+    @staticmethod
+    def __get_fen_row_valuation(row_to_evaluate):
+        valuation = [0, 0, 0, 0]
+        for value in row_to_evaluate:
+            if value in fen_letter_row_valuation:
+                index, piece_value = fen_letter_row_valuation[value]
+                valuation[index] += 1
+                valuation[index + 1] += piece_value
+        return tuple(valuation)
+
     def get_piece_count_and_value_for_fen_row(self, row):
         """
         Returns the number of white and black board for a specified row in the the fen string (includes king)
@@ -91,28 +157,9 @@ class FenStats:
         row = fen row number between 1 and 8
         color = chess.WHITE or chess.BLACK
         """
-        w_piece_count = 0
-        w_piece_valuation = 0
-        b_piece_count = 0
-        b_piece_valuation = 0
-
         if not str(row).isnumeric() or (row < 1 or row > 8):
             log.error("invalid fen row {}".format(str(row)))
             return 0, 0, 0, 0
 
-        fen_rows = self.fen_position.split("/")
-        fen_rows = list(reversed(fen_rows))
-
-        row_to_evaluate = fen_rows[row - 1]
-        for value in row_to_evaluate:
-            if not str(value).isnumeric():
-                if str(value).lower() in piece_fen_letter_to_chess_piece:
-                    chess_piece = piece_fen_letter_to_chess_piece[str(value).lower()]
-                    color = chess.WHITE if str(value).upper() == value else chess.BLACK
-                    w_piece_count += 1 if color == chess.WHITE else 0
-                    b_piece_count += 1 if color == chess.BLACK else 0
-                    w_piece_valuation += piece_fen_value[chess_piece] if color == chess.WHITE else 0
-                    b_piece_valuation += piece_fen_value[chess_piece] if color == chess.BLACK else 0
-
-        return w_piece_count, w_piece_valuation, b_piece_count, b_piece_valuation
+        return self.get_fen_row_counts_and_valuation()[row - 1]
 
@@ -0,0 +1,150 @@
+import datetime
+import logging
+
+import chess.pgn
+
+log = logging.getLogger("pgn2data - game filter")
+logging.basicConfig(level=logging.INFO)
+
+# speed of a game from its TimeControl header, the same as lichess:
+# the estimated duration of the game is the base time plus 40 times the increment, in seconds
+SPEED_ULTRABULLET = "ultrabullet"
+SPEED_BULLET = "bullet"
+SPEED_BLITZ = "blitz"
+SPEED_RAPID = "rapid"
+SPEED_CLASSICAL = "classical"
+SPEED_CORRESPONDENCE = "correspondence"
+speed_options = [SPEED_ULTRABULLET, SPEED_BULLET, SPEED_BLITZ, SPEED_RAPID, SPEED_CLASSICAL, SPEED_CORRESPONDENCE]
+
+# estimated durations up to these numbers of seconds
+speed_limits = [(29, SPEED_ULTRABULLET), (179, SPEED_BULLET), (479, SPEED_BLITZ), (1499, SPEED_RAPID)]
+
+
+class GameFilter:
+    """
+    Selects the games to convert from their headers, the games that are not selected are skipped
+    before their moves are read. A game is selected when it matches all the conditions that are set:
+        min_elo, max_elo - the WhiteElo and BlackElo of the game are both in the range
+        speeds - the speed of the game from its TimeControl header is one of speed_options in the list
+        time_controls - the TimeControl header is in the list, for example ["180+0", "180+2"]
+        variants - the Variant header is in the list, games without a Variant header are "Standard"
+        start_date, end_date - the Date header (or UTCDate) is in the range, in the format yyyy.mm.dd or a date
+        events - the Event header contains one of the texts in the list, ignoring case
+        players - the White or Black player is in the list
+        predicate - function called with the headers of the game, which returns True to select it.
+                    When exporting with workers, it must be defined at module level
+    """
+
+    def __init__(self, min_elo=None, max_elo=None, speeds=None, time_controls=None, variants=None, start_date=None,
+                 end_date=None, events=None, players=None, predicate=None):
+        if speeds is not None and any(speed not in speed_options for speed in speeds):
+            raise ValueError("speeds must be in: " + ", ".join(speed_options))
+        if predicate is not None and not callable(predicate):
+            raise TypeError("predicate must be a function that takes the headers of a game")
+        self.min_elo = min_elo
+        self.max_elo = max_elo
+        self.speeds = set(speeds) if speeds is not None else None
+        self.time_controls = set(time_controls) if time_controls is not None else None
+        self.variants = set(variant.lower() for variant in variants) if variants is not None else None
+        self.start_date = self.__get_date_text(start_date)
+        self.end_date = self.__get_date_text(end_date)
+        self.events = [event.lower() for event in events] if events is not None else None
+        self.players = set(players) if players is not None else None
+        self.predicate = predicate
+
+    def is_match(self, headers):
+        """
+        returns True if the game with these headers is selected, the cheapest conditions are checked first
+        """
+        if self.time_controls is not None and headers.get("TimeControl") not in self.time_controls:
+            return False
+        if self.speeds is not None and get_speed(headers.get("TimeControl")) not in self.speeds:
+            return False
+        if self.variants is not None and headers.get("Variant", "Standard").lower() not in self.variants:
+            return False
+        if self.players is not None and headers.get("White") not in self.players \
+                and headers.get("Black") not in self.players:
+            return False
+        if self.events is not None:
+            event = headers.get("Event", "").lower()
+            if not any(text in event for text in self.events):
+                return False
+        if self.min_elo is not None or self.max_elo is not None:
+            for elo in [get_elo(headers.get("WhiteElo")), get_elo(headers.get("BlackElo"))]:
+                if elo is None or (self.min_elo is not None and elo < self.min_elo) or \
+                        (self.max_elo is not None and elo > self.max_elo):
+                    return False
+        if self.start_date is not None or self.end_date is not None:
+            # the headers of a game always have a Date, which is "????.??.??" when the pgn file has no Date
+            date = headers.get("Date", "?")
+            if "?" in date:
+                date = headers.get("UTCDate", "?")
+            # dates in the yyyy.mm.dd format are in the same order as the text, unknown dates are not selected
+            if "?" in date or (self.start_date is not None and date < self.start_date) or \
+                    (self.end_date is not None and date > self.end_date):
+                return False
+        return self.predicate is None or bool(self.predicate(headers))
+
+    def get_options(self):
+        """
+        the conditions of the filter, these are saved with checkpoints so an export is resumed with the same filter
+        """
+        return {"min_elo": self.min_elo,
+                "max_elo": self.max_elo,
+                "speeds": sorted(self.speeds) if self.speeds is not None else None,
+                "time_controls": sorted(self.time_controls) if self.time_controls is not None else None,
+                "variants": sorted(self.variants) if self.variants is not None else None,
+                "start_date": self.start_date,
+                "end_date": self.end_date,
+                "events": self.events,
+                "players": sorted(self.players) if self.players is not None else None,
+                "predicate": getattr(self.predicate, "__qualname__", None)}
+
+    @staticmethod
+    def __get_date_text(date):
+        if isinstance(date, (datetime.date, datetime.datetime)):
+            return date.strftime("%Y.%m.%d")
+        return date
+
+
+class FilteredGameBuilder(chess.pgn.GameBuilder):
+    """
+    Builds a game read from a pgn file when it is selected by the filter,
+    the moves of the games that are not selected are skipped without being parsed
+    """
+
+    def __init__(self, game_filter):
+        super().__init__()
+        self.game_filter = game_filter
+        self.is_rejected = False
+
+    def end_headers(self):
+        self.is_rejected = not self.game_filter.is_match(self.game.headers)
+        return chess.pgn.SKIP if self.is_rejected else None
+
+
+def get_speed(time_control):
+    """
+    returns the speed of a game from its TimeControl header, for example "180+2" is blitz,
+    or None if the time control is missing or not valid
+    """
+    if time_control is None:
+        return None
+    if time_control == "-":
+        return SPEED_CORRESPONDENCE
+    try:
+        base, _, increment = time_control.partition("+")
+        duration = int(base) + 40 * (int(increment) if increment else 0)
+    except ValueError:
+        return None
+    for limit, speed in speed_limits:
+        if duration <= limit:
+            return speed
+    return SPEED_CLASSICAL
+
+
+def get_elo(elo):
+    try:
+        return int(elo)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,126 @@
+import logging
+import sqlite3
+
+import chess
+
+from common.common import get_hash_key
+
+log = logging.getLogger("pgn2data - game index")
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_INDEX_DEPTH = 16
+
+
+class GameIndex:
+    """
+    Index of the games by their first moves, stored in a SQLite file next to the output files
+    For each of the first depth moves of a game it has a row in each table:
+        moves - key of the moves of the game up to the move, from the starting position of the game
+        positions - key of the position of the pieces after the move, which is the position_id of the positions file
+    the keys are 63 bit hashes, so the file is small and a lookup only reads the rows of one key.
+    The ids of the games are in the order they were added, which is the game order of the games file.
+    depth is saved in the file, when it is None the depth of an existing index is used
+    """
+
+    # number of rows kept before they are inserted into the file
+    COMMIT_SIZE = 100000
+
+    def __init__(self, path, depth=None):
+        self.path = path
+        self.__moves_rows = []
+        self.__positions_rows = []
+        self.__connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        # the index is created again if an export does not complete, so the writes are not synced to disk
+        self.__connection.execute("PRAGMA synchronous=OFF")
+        self.__connection.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value)")
+        self.__connection.execute("CREATE TABLE IF NOT EXISTS moves (key INTEGER NOT NULL, game_id NOT NULL)")
+        self.__connection.execute("CREATE TABLE IF NOT EXISTS positions (key INTEGER NOT NULL, game_id NOT NULL)")
+        if depth is not None:
+            self.__connection.execute("INSERT OR REPLACE INTO settings VALUES ('depth', ?)", (depth,))
+        self.__connection.commit()
+        row = self.__connection.execute("SELECT value FROM settings WHERE name = 'depth'").fetchone()
+        self.depth = row[0] if row is not None else DEFAULT_INDEX_DEPTH
+
+    def add_game(self, game_id, start_fen, moves, positions):
+        """
+        moves are the uci of the first depth moves of the game, starting from start_fen,
+        and positions are the board fens after each of these moves
+        """
+        key_text = start_fen
+        position_keys = set()
+        for move, position in zip(moves, positions):
+            key_text += " " + move
+            self.__moves_rows.append((get_hash_key(key_text), game_id))
+            # a position can be repeated within the first moves, the game is only added to it once
+            position_key = get_hash_key(position)
+            if position_key not in position_keys:
+                position_keys.add(position_key)
+                self.__positions_rows.append((position_key, game_id))
+        if len(self.__moves_rows) >= self.COMMIT_SIZE:
+            self.__write_rows()
+
+    def merge(self, path):
+        """
+        adds the games of the index in the file path after the games of this index
+        """
+        self.__write_rows()
+        self.__connection.execute("ATTACH DATABASE ? AS part", (path,))
+        self.__connection.execute("INSERT INTO moves SELECT key, game_id FROM part.moves ORDER BY rowid")
+        self.__connection.execute("INSERT INTO positions SELECT key, game_id FROM part.positions ORDER BY rowid")
+        self.__connection.commit()
+        self.__connection.execute("DETACH DATABASE part")
+
+    def get_games_by_moves(self, moves, start_fen=chess.STARTING_FEN):
+        """
+        returns the ids of the games that start with the moves, which are a list of moves in SAN or UCI notation
+        or a move sequence like "e4|e5|Nf3". Only the first depth moves of each game are in the index.
+        raises ValueError if a move is not valid or there are more moves than the depth
+        """
+        if isinstance(moves, str):
+            moves = moves.split("|") if len(moves) > 0 else []
+        if len(moves) == 0 or len(moves) > self.depth:
+            raise ValueError("the index has the first {} moves of each game, {} moves were given".format(
+                self.depth, len(moves)))
+        board = chess.Board(start_fen)
+        key_text = start_fen
+        for move in moves:
+            try:
+                board_move = board.parse_san(move)
+            except ValueError:
+                try:
+                    board_move = board.parse_uci(move)
+                except ValueError:
+                    raise ValueError("{} is not a legal move in the position {}".format(move, board.fen()))
+            board.push(board_move)
+            key_text += " " + str(board_move)
+        return self.__get_game_ids("moves", get_hash_key(key_text))
+
+    def get_games_by_position(self, fen):
+        """
+        returns the ids of the games with the position of the pieces of the fen after one of their first depth moves
+        """
+        return self.__get_game_ids("positions", get_hash_key(chess.Board(fen).board_fen()))
+
+    def close(self, create_indexes=True):
+        """
+        the tables are indexed on their keys once all the games have been added, which is faster than updating
+        the indexes as the rows are inserted. The index of a part that is merged into another index is not needed.
+        """
+        self.__write_rows()
+        if create_indexes:
+            self.__connection.execute("CREATE INDEX IF NOT EXISTS moves_key ON moves (key)")
+            self.__connection.execute("CREATE INDEX IF NOT EXISTS positions_key ON positions (key)")
+            self.__connection.commit()
+        self.__connection.close()
+
+    def __get_game_ids(self, table, key):
+        rows = self.__connection.execute("SELECT game_id FROM {} WHERE key = ? ORDER BY rowid".format(table),
+                                         (key,))
+        return [row[0] for row in rows]
+
+    def __write_rows(self):
+        self.__connection.executemany("INSERT INTO moves VALUES (?, ?)", self.__moves_rows)
+        self.__connection.executemany("INSERT INTO positions VALUES (?, ?)", self.__positions_rows)
+        self.__connection.commit()
+        self.__moves_rows = []
+        self.__positions_rows = []
@@ -0,0 +1,87 @@
+from collections import Counter
+
+
+class GameState:
+    """
+    Tracks the state of a game as its moves are pushed, so the checks for the end of the game do not
+    replay the moves of the game. The results are the same as the methods of the board with the same name.
+        repetitions - number of times each position has occurred since the last irreversible move,
+                      keyed by the pieces, the side to move, the castling rights and the en passant square,
+                      which is what the board compares to find repetitions
+        legal moves - whether the side to move has a legal move, this is only generated once for each position
+                      and only when a check needs it
+    track_repetitions can be False when is_fivefold_repetition and is_game_over are not used
+    """
+
+    def __init__(self, board, track_repetitions=True):
+        self.board = board
+        self.track_repetitions = track_repetitions
+        self.__repetitions = Counter()
+        self.__key = None
+        self.__has_legal_moves = None
+        if track_repetitions:
+            self.__key = self.__get_key(board)
+            self.__repetitions[self.__key] += 1
+
+    def push(self, move):
+        board = self.board
+        if self.track_repetitions and board.is_irreversible(move):
+            # the positions before an irreversible move can not occur again
+            self.__repetitions.clear()
+        board.push(move)
+        self.__has_legal_moves = None
+        if self.track_repetitions:
+            self.__key = self.__get_key(board)
+            self.__repetitions[self.__key] += 1
+
+    @staticmethod
+    def __get_key(board):
+        """
+        the en passant square is only part of the position when an en passant capture is legal
+        """
+        ep_square = board.ep_square if board.ep_square is not None and board.has_legal_en_passant() else None
+        return board.board_fen(), board.turn, board.castling_rights, ep_square
+
+    def has_legal_moves(self):
+        if self.__has_legal_moves is None:
+            self.__has_legal_moves = any(self.board.generate_legal_moves())
+        return self.__has_legal_moves
+
+    def is_check(self):
+        return self.board.is_check()
+
+    def is_checkmate(self):
+        return self.board.is_check() and not self.has_legal_moves()
+
+    def is_stalemate(self):
+        return not self.board.is_check() and not self.has_legal_moves()
+
+    def is_fifty_moves(self):
+        return self.board.halfmove_clock >= 100 and self.has_legal_moves()
+
+    def is_seventyfive_moves(self):
+        return self.board.halfmove_clock >= 150 and self.has_legal_moves()
+
+    def is_fivefold_repetition(self):
+        return self.is_repetition(5)
+
+    def is_repetition(self, count=3):
+        if not self.track_repetitions:
+            return self.board.is_repetition(count)
+        return self.__repetitions[self.__key] >= count
+
+    def is_insufficient_material(self):
+        return self.board.is_insufficient_material()
+
+    def is_game_over(self):
+        """
+        the same conditions as board.outcome(), the cheapest are checked first and
+        checkmate and stalemate are both covered by having no legal moves
+        """
+        board = self.board
+        if board.is_variant_loss() or board.is_variant_win() or board.is_variant_draw():
+            return True
+        if self.is_repetition(5) or board.halfmove_clock >= 150:
+            # without legal moves the game is also over, by checkmate or stalemate
+            return True
+        return board.is_insufficient_material() or not self.has_legal_moves()
@@ -93,3 +93,51 @@ file_headers_moves = ["game_id",
                       "move_sequence"]
 
 file_headers_stockfish = ["eval", "prev_eval", "diff_eval", "depth"]
+
+# the positions file has the fen and the columns of the moves file calculated from it, once for each position
+file_headers_positions = ["position_id", "fen"] + file_headers_moves[file_headers_moves.index("white_count"):
+                                                                     file_headers_moves.index("move_sequence")]
+
+# the type of each column, used for typed output formats and when loading the files into pandas
+# "category" columns have few distinct values, columns that are not listed are strings
+column_types = {"game_order": "int32",
+                "event": "category",
+                "site": "category",
+                "round": "category",
+                "white": "category",
+                "black": "category",
+                "result": "category",
+                "white_elo": "int16",
+                "white_rating_diff": "int16",
+                "black_elo": "int16",
+                "black_rating_diff": "int16",
+                "white_title": "category",
+                "black_title": "category",
+                "winner": "category",
+                "winner_elo": "int16",
+                "loser": "category",
+                "loser_elo": "int16",
+                "winner_loser_elo_diff": "int16",
+                "eco": "category",
+                "termination": "category",
+                "time_control": "category",
+                "variant": "category",
+                "ply_count": "int16",
+                "file_name": "category",
+                "move_no": "int16",
+                "move_no_pair": "int16",
+                "player": "category",
+                "notation": "category",
+                "from_square": "category",
+                "to_square": "category",
+                "piece": "category",
+                "color": "category",
+                "eval": "float32",
+                "prev_eval": "float32",
+                "diff_eval": "float32",
+                "depth": "int8",
+                "position_id": "int64"}
+
+column_types.update({header: "bool" for header in file_headers_moves if header.startswith("is_")})
+column_types.update({header: "int8" for header in file_headers_moves
+                     if header.endswith(("_count", "_value")) or header.startswith("captured_score")})
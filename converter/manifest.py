@@ -0,0 +1,109 @@
+import hashlib
+import json
+import logging
+import os.path
+
+from common.pgn_reader import is_compressed
+
+log = logging.getLogger("pgn2data - manifest")
+logging.basicConfig(level=logging.INFO)
+
+FILE_NEW = "new"
+FILE_UNCHANGED = "unchanged"
+FILE_APPENDED = "appended"  # games were added to the end of the file
+FILE_CHANGED = "changed"
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class Manifest:
+    """
+    List of the pgn files converted into the output files, used by incremental exports
+    The manifest is saved in a JSON file next to the output files, for each pgn file it has:
+        size, mtime and hash - size, modified time and sha256 of the file when it was converted
+        game_count - number of games converted from the file
+    games_size and moves_size are the sizes of the output files when the manifest was saved,
+    rows written after that are from an export that did not complete.
+    options are the inputs of the export, a manifest is only used by an export with the same options
+    """
+
+    def __init__(self, file_name, options):
+        self.file_name = file_name
+        # the options are compared with the options loaded from the file, so they are stored as they would be loaded
+        self.options = json.loads(json.dumps(options))
+        self.files = {}
+        self.games_size = 0
+        self.moves_size = 0
+
+    def load(self):
+        """
+        returns True if the manifest was loaded, or False if there is no manifest
+        raises ValueError if the manifest was saved by an export with different options
+        """
+        if not os.path.isfile(self.file_name):
+            return False
+        with open(self.file_name, encoding="utf-8") as file:
+            data = json.load(file)
+        if data["options"] != self.options:
+            raise ValueError("The manifest {} was saved by an export with different options, "
+                             "remove it and the output files to export all the files again".format(self.file_name))
+        self.files = data["files"]
+        self.games_size = data["games_size"]
+        self.moves_size = data["moves_size"]
+        return True
+
+    def save(self):
+        data = {"options": self.options,
+                "files": self.files,
+                "games_size": self.games_size,
+                "moves_size": self.moves_size}
+        # the file is replaced in one step, so a crash while it is written does not lose the previous manifest
+        temp_file_name = self.file_name + ".tmp"
+        with open(temp_file_name, mode='w', encoding="utf-8") as file:
+            json.dump(data, file, indent=2)
+        os.replace(temp_file_name, self.file_name)
+
+    def get_change(self, pgn_file):
+        """
+        returns how the file has changed since it was converted, one of FILE_NEW, FILE_UNCHANGED,
+        FILE_APPENDED or FILE_CHANGED, and the entry of the file in the manifest
+        the file is only read when its size or modified time has changed
+        """
+        entry = self.files.get(os.path.abspath(pgn_file))
+        if entry is None:
+            return FILE_NEW, None
+        stat = os.stat(pgn_file)
+        if stat.st_size == entry["size"] and stat.st_mtime == entry["mtime"]:
+            return FILE_UNCHANGED, entry
+        if stat.st_size == entry["size"] and get_file_hash(pgn_file) == entry["hash"]:
+            return FILE_UNCHANGED, entry
+        # the games added to a compressed file cannot be read on their own, so it is converted again
+        if stat.st_size > entry["size"] and not is_compressed(pgn_file) \
+                and get_file_hash(pgn_file, entry["size"]) == entry["hash"]:
+            return FILE_APPENDED, entry
+        return FILE_CHANGED, entry
+
+    def update(self, pgn_file, size, mtime, file_hash, game_count):
+        self.files[os.path.abspath(pgn_file)] = {"size": size,
+                                                 "mtime": mtime,
+                                                 "hash": file_hash,
+                                                 "game_count": game_count}
+
+    def remove(self, pgn_file):
+        self.files.pop(os.path.abspath(pgn_file), None)
+
+
+def get_file_hash(file_name, size=None):
+    """
+    returns the sha256 of the file, or of its first size bytes
+    """
+    file_hash = hashlib.sha256()
+    remaining = os.path.getsize(file_name) if size is None else size
+    with open(file_name, mode='rb') as file:
+        while remaining > 0:
+            data = file.read(min(HASH_BLOCK_SIZE, remaining))
+            if not data:
+                break
+            file_hash.update(data)
+            remaining -= len(data)
+    return file_hash.hexdigest()
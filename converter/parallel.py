@@ -0,0 +1,180 @@
+import csv
+import logging
+import os.path
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from common.common import open_file, add_statistics
+from common.pgn_reader import get_game_ranges, is_compressed
+from converter.game_index import GameIndex
+from converter.headers import file_headers_game
+from converter.process import Process, get_file_occurrences
+from converter.writer import get_writer
+
+log = logging.getLogger("pgn2data - parallel")
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_SPLIT_SIZE = 64 * 1024 * 1024
+
+
+class ParallelProcess:
+    """
+    Converts a list of pgn files using a pool of OS processes
+    large pgn files are split into byte ranges at the start of a game, so one file can use several processes
+    each file or range is converted into its own part files, which are then
+    merged into the output files in the same order as the input list
+    process_options are the keyword arguments passed to each Process
+    file_positions is the positions file when process_options has positions, each part has the positions
+    it has seen and those already written by the previous parts are skipped when it is merged
+    game_index is a GameIndex, each part has its own index which is merged into it
+    """
+
+    def __init__(self, file_list, file_games, file_moves, workers, process_options, split_size=DEFAULT_SPLIT_SIZE,
+                 file_positions=None, game_index=None):
+        self.file_list = file_list
+        self.file_games = file_games
+        self.file_moves = file_moves
+        self.file_positions = file_positions
+        self.position_ids = set()
+        self.game_index = game_index
+        self.workers = workers
+        self.process_options = process_options
+        self.moves_required = process_options["moves_required"]
+        self.split_size = split_size
+        self.statistics = {}
+
+    def parse_files(self):
+        """
+        largest jobs are scheduled first so the pool is not left waiting on one big job at the end
+        """
+        jobs = self.__get_jobs()
+        log.info("Processing {} files in {} parts using {} workers".format(len(self.file_list), len(jobs),
+                                                                          self.workers))
+        part_folder = tempfile.mkdtemp(prefix="pgn2data_", dir=self.__get_output_folder())
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = {}
+                for index in sorted(range(len(jobs)), key=lambda i: self.__get_job_size(jobs[i]), reverse=True):
+                    file_name, start, end, file_occurrence = jobs[index]
+                    games_part, moves_part, positions_part, index_part = self.__get_part_names(part_folder, index)
+                    futures[index] = executor.submit(convert_part, file_name, games_part, moves_part, start, end,
+                                                     index == 0, self.process_options, positions_part, index_part,
+                                                     self.game_index.depth if self.game_index is not None else None,
+                                                     file_occurrence)
+
+                # parts are merged in input order, so the output is the same as a sequential run
+                order_offset = 0
+                for index in range(len(jobs)):
+                    games_part, moves_part, positions_part, index_part, statistics = futures[index].result()
+                    order_offset = 0 if jobs[index][1] == 0 else order_offset
+                    self.__merge_games_part(games_part, order_offset)
+                    if self.moves_required:
+                        self.__merge_part(moves_part, self.file_moves)
+                    if positions_part is not None:
+                        self.__merge_positions_part(positions_part, index == 0)
+                    if index_part is not None:
+                        self.game_index.merge(index_part)
+                        os.remove(index_part)
+                    order_offset += statistics["game_count"]
+                    add_statistics(self.statistics, statistics)
+                if self.file_positions is not None:
+                    self.statistics["position_count"] = len(self.position_ids)
+        finally:
+            shutil.rmtree(part_folder, ignore_errors=True)
+
+    def __get_jobs(self):
+        """
+        returns a list of tuples: (file name, start, end, number of times the file is in the list before)
+        """
+        jobs = []
+        for file_name, file_occurrence in zip(self.file_list, get_file_occurrences(self.file_list)):
+            if is_compressed(file_name):
+                # a compressed file cannot be split without decompressing it, so it is converted by one worker
+                jobs.append((file_name, 0, None, file_occurrence))
+                continue
+            parts = min(self.workers, max(os.path.getsize(file_name) // self.split_size, 1))
+            for start, end in get_game_ranges(file_name, parts):
+                jobs.append((file_name, start, end, file_occurrence))
+        return jobs
+
+    @staticmethod
+    def __get_job_size(job):
+        file_name, start, end, _ = job
+        return (os.path.getsize(file_name) if end is None else end) - start
+
+    def __get_output_folder(self):
+        # parts are kept next to the outputs as they can be as large as the outputs themselves
+        return os.path.dirname(os.path.abspath(self.file_games.name))
+
+    def __get_part_names(self, part_folder, index):
+        games_part = os.path.join(part_folder, "{}_game_info.csv".format(index))
+        moves_part = os.path.join(part_folder, "{}_moves.csv".format(index)) if self.moves_required else None
+        positions_part = os.path.join(part_folder, "{}_positions.csv".format(index)) \
+            if self.file_positions is not None else None
+        index_part = os.path.join(part_folder, "{}_index.sqlite".format(index)) if self.game_index is not None else None
+        return games_part, moves_part, positions_part, index_part
+
+    def __merge_games_part(self, games_part, order_offset):
+        """
+        the game order of a range that is not at the start of the file continues from the previous range
+        """
+        if order_offset == 0:
+            self.__merge_part(games_part, self.file_games)
+            return
+        order_index = file_headers_game.index("game_order")
+        game_writer = get_writer(self.file_games)
+        with open(games_part, mode='r', newline='', encoding="utf-8") as part:
+            for row in csv.reader(part):
+                row[order_index] = int(row[order_index]) + order_offset
+                game_writer.writerow(row)
+        os.remove(games_part)
+
+    def __merge_positions_part(self, positions_part, has_headers):
+        """
+        the positions of the part that were written by a previous part are skipped
+        """
+        positions_writer = get_writer(self.file_positions)
+        with open(positions_part, mode='r', newline='', encoding="utf-8") as part:
+            reader = csv.reader(part)
+            if has_headers:
+                positions_writer.writerow(next(reader))
+            for row in reader:
+                if row[0] not in self.position_ids:
+                    self.position_ids.add(row[0])
+                    positions_writer.writerow(row)
+        os.remove(positions_part)
+
+    @staticmethod
+    def __merge_part(part_name, file_output):
+        with open(part_name, mode='r', newline='', encoding="utf-8") as part:
+            if hasattr(file_output, "writerow"):
+                # the output is not a csv file, so the rows are passed to its writer
+                file_output.writerows(csv.reader(part))
+            else:
+                shutil.copyfileobj(part, file_output)
+        os.remove(part_name)
+
+
+def convert_part(pgn_file, games_part, moves_part, start, end, add_headers_flag, process_options,
+                 positions_part=None, index_part=None, index_depth=None, file_occurrence=0):
+    """
+    entry point of each worker process, converts one pgn file or range into its own part files
+    """
+    file_games = open_file(games_part)
+    file_moves = open_file(moves_part) if moves_part is not None else None
+    file_positions = open_file(positions_part) if positions_part is not None else None
+    game_index = GameIndex(index_part, index_depth) if index_part is not None else None
+    try:
+        process = Process(pgn_file, file_games, file_moves, start=start, end=end, file_positions=file_positions,
+                          game_index=game_index, file_occurrence=file_occurrence, **process_options)
+        process.parse_file(add_headers_flag)
+    finally:
+        file_games.close()
+        if file_moves is not None:
+            file_moves.close()
+        if file_positions is not None:
+            file_positions.close()
+        if game_index is not None:
+            game_index.close(create_indexes=False)
+    return games_part, moves_part, positions_part, index_part, process.get_statistics()
@@ -1,12 +1,24 @@
+import importlib.util
 import logging
-import ntpath
 import os.path
-import pandas as pd
-
-from common.common import open_file
-from common.log_time import TimeProcess
-from converter.process import Process
+from functools import partial
+
+from common.common import open_file, add_statistics, DEFAULT_BUFFER_SIZE
+from common.log_time import TimeProcess, print_stage_timings
+from common.pgn_reader import get_pgn_file_name, is_compressed, get_compression
+from converter.checkpoint import Checkpoint, DEFAULT_CHECKPOINT_INTERVAL
+from converter.eval_cache import DEFAULT_EVAL_CACHE_SIZE
+from converter.game_filter import GameFilter
+from converter.game_index import GameIndex, DEFAULT_INDEX_DEPTH
+from converter.headers import file_headers_moves
+from converter.manifest import Manifest, FILE_NEW, FILE_UNCHANGED, FILE_APPENDED, get_file_hash
+from converter.parallel import ParallelProcess, DEFAULT_SPLIT_SIZE
+from converter.process import Process, DEFAULT_FEN_ROW_CACHE_SIZE, MOVE_SEQUENCE_FULL, move_sequence_options, \
+    GAME_ID_UUID, GAME_ID_INT, game_id_options, get_file_occurrences
+from converter.progress import DEFAULT_PROGRESS_INTERVAL
 from converter.result import ResultFile, Result
+from converter.writer import ParquetWriter, ColumnTracker, FORMAT_CSV, FORMAT_PARQUET, format_options, \
+    compression_options, get_file_extension, remove_csv_columns, remove_parquet_columns, remove_game_rows
 
 log = logging.getLogger("pgn2data - pgn_data class")
 logging.basicConfig(level=logging.INFO)
@@ -14,6 +26,15 @@ logging.basicConfig(level=logging.INFO)
 DEFAULT_MOVES_REQUIRED = True
 DEFAULT_QUEUE_SIZE = 0
 DEFAULT_COLLAPSE = False
+DEFAULT_WORKERS = 1
+DEFAULT_MOVE_SEQUENCE = MOVE_SEQUENCE_FULL
+DEFAULT_FORMAT = FORMAT_CSV
+DEFAULT_TIMINGS = False
+DEFAULT_RESUME = False
+DEFAULT_INCREMENTAL = False
+DEFAULT_COMPRESSION = None
+DEFAULT_POSITIONS = False
+DEFAULT_INDEX = False
 
 
 class PGNData:
@@ -33,6 +54,16 @@ class PGNData:
         self._file_name = file_name
         self._engine_path = None
         self._depth = 20
+        self._engine_count = 1
+        self._eval_cache_path = None
+        self._eval_cache_size = DEFAULT_EVAL_CACHE_SIZE
+        self._split_size = DEFAULT_SPLIT_SIZE
+        self._fen_row_cache_size = DEFAULT_FEN_ROW_CACHE_SIZE
+        self._checkpoint_interval = None
+        self._buffer_size = DEFAULT_BUFFER_SIZE
+        self._game_filter = None
+        self._game_id_type = GAME_ID_UUID
+        self._index_depth = DEFAULT_INDEX_DEPTH
 
     def set_engine_path(self, path):
         self._engine_path = path
@@ -43,12 +74,143 @@ class PGNData:
         else:
             log.error("Invalid engine depth specified: " + str(depth))
 
-    def export(self, moves_required: bool = DEFAULT_MOVES_REQUIRED, queue_size: int = DEFAULT_QUEUE_SIZE, collapse: bool = DEFAULT_COLLAPSE):
+    def set_engine_count(self, count):
+        """
+        number of engines started to evaluate the positions of each game concurrently
+        """
+        if type(count) == int and count > 0:
+            self._engine_count = count
+        else:
+            log.error("Invalid engine count specified: " + str(count))
+
+    def set_engine_cache(self, path, max_size=DEFAULT_EVAL_CACHE_SIZE):
+        """
+        engine evaluations are saved in this SQLite file and reused in later exports,
+        max_size is the number of positions kept, the least recently used are removed first
+        """
+        if type(max_size) == int and max_size > 0:
+            self._eval_cache_path = path
+            self._eval_cache_size = max_size
+        else:
+            log.error("Invalid engine cache size specified: " + str(max_size))
+
+    def set_fen_row_cache_size(self, size):
+        """
+        number of fen rows kept in memory with their piece counts and valuations,
+        the least recently used fen rows are removed first, 0 turns the cache off
+        """
+        if type(size) == int and size >= 0:
+            self._fen_row_cache_size = size
+        else:
+            log.error("Invalid fen row cache size specified: " + str(size))
+
+    def set_split_size(self, size):
+        """
+        when exporting with workers, pgn files larger than this size in bytes
+        are split into ranges that are converted in separate processes
+        """
+        if type(size) == int and size > 0:
+            self._split_size = size
+        else:
+            log.error("Invalid split size specified: " + str(size))
+
+    def set_checkpoint_interval(self, seconds):
+        """
+        number of seconds between the checkpoints saved while exporting csv files with 1 worker,
+        an export can be resumed from its last checkpoint, 0 turns off the checkpoints during a file
+        when it is not set, checkpoints are only saved by the exports with resume
+        """
+        if type(seconds) in (int, float) and seconds >= 0:
+            self._checkpoint_interval = seconds
+        else:
+            log.error("Invalid checkpoint interval specified: " + str(seconds))
+
+    def set_buffer_size(self, size):
+        """
+        number of bytes kept in memory before they are written to the output files,
+        a larger buffer means fewer and larger writes
+        """
+        if type(size) == int and size > 0:
+            self._buffer_size = size
+        else:
+            log.error("Invalid buffer size specified: " + str(size))
+
+    def set_game_filter(self, game_filter):
+        """
+        only the games selected by the GameFilter are converted, the moves of the other games are not read
+        None converts all the games
+        """
+        if game_filter is None or isinstance(game_filter, GameFilter):
+            self._game_filter = game_filter
+        else:
+            log.error("Invalid game filter specified: " + str(game_filter))
+
+    def set_game_id_type(self, game_id_type):
+        """
+        "uuid" gives each game a random uuid, different on every export
+        "int" gives each game an integer from the full path of the pgn file and the position of the game in the file,
+        the same on every export of the file from the same folder, the repeats of a file in the list have other ids
+        """
+        if game_id_type in game_id_options:
+            self._game_id_type = game_id_type
+        else:
+            log.error("Invalid game id type specified: " + str(game_id_type))
+
+    def set_index_depth(self, depth):
+        """
+        number of moves of each game added to the index, when exporting with index=True
+        """
+        if type(depth) == int and depth > 0:
+            self._index_depth = depth
+        else:
+            log.error("Invalid index depth specified: " + str(depth))
+
+    def export(self, moves_required: bool = DEFAULT_MOVES_REQUIRED, queue_size: int = DEFAULT_QUEUE_SIZE,
+               collapse: bool = DEFAULT_COLLAPSE, workers: int = DEFAULT_WORKERS,
+               move_sequence: str = DEFAULT_MOVE_SEQUENCE, format: str = DEFAULT_FORMAT,
+               timings: bool = DEFAULT_TIMINGS, progress=None, progress_interval=None,
+               resume: bool = DEFAULT_RESUME, incremental: bool = DEFAULT_INCREMENTAL,
+               compression: str = DEFAULT_COMPRESSION, columns: list = None, positions: bool = DEFAULT_POSITIONS,
+               index: bool = DEFAULT_INDEX):
         """
         main method to convert pgn to csv
         :parameter moves_required - if true a games and moves file is created
         :parameter queue_size - this is the max_size of the blocking queue when processing moves
         :parameter collapse - this removes any null columns from the final files
+        :parameter workers - number of OS processes used to convert the pgn files in parallel,
+                             large files are split so they are also converted in parallel
+        :parameter move_sequence - "full" has the moves up to the current move on every row,
+                                   "last" has all the moves of a game on the last row of the game only,
+                                   "none" leaves out the move_sequence column
+        :parameter format - "csv" or "parquet", parquet files have typed columns and need pyarrow installed
+        :parameter timings - if true the time taken by each stage of the conversion is added to the result
+        :parameter progress - function called with a Progress object every progress_interval seconds,
+                              if it is None the progress is logged. When workers is more than 1, each worker reports
+                              the progress of its own file or part, so the function must be defined at module level
+        :parameter progress_interval - number of seconds between progress reports, 0 turns them off.
+                                       If it is None the progress is only reported to the progress function,
+                                       every 60 seconds
+        :parameter resume - if true checkpoints are saved as the files are exported, and if the export was stopped
+                            before it completed, the output files are truncated to the last checkpoint and the export
+                            continues from there (csv files and 1 worker only)
+        :parameter incremental - if true the pgn files converted by a previous export into the same output files
+                                 are skipped, only new files and games added to the end of a file are converted.
+                                 The rows of files that have changed are removed and the files converted again.
+                                 (csv files and 1 worker only, it can not be used with collapse or resume)
+        :parameter compression - "gzip", "bz2", "xz" or "zstd" compresses the csv files as they are written,
+                                 the extension of the compression is added to the file names.
+                                 (it can not be used with resume or incremental, zstd needs zstandard installed)
+        :parameter columns - list of the columns of the moves file to create, the values of the other columns are
+                             not calculated. game_id is always included, and move_sequence is only included if
+                             move_sequence is not "none". None creates all the columns
+        :parameter positions - if true a positions file is created with the fen and the columns calculated from it,
+                               once for each position. The moves file has a position_id column in their place,
+                               which is the id of the position in the positions file.
+                               (it can not be used with resume or incremental)
+        :parameter index - if true a SQLite file is created with the games indexed by their first moves and the
+                           positions after them, which is used to find the games with the methods of the result.
+                           The number of moves indexed is set with set_index_depth
+                           (it can not be used with resume or incremental)
         """
 
         if not isinstance(moves_required, bool):
@@ -57,6 +219,50 @@ class PGNData:
             raise ValueError("queue_size must be an int greater or equal to 0")
         if not isinstance(collapse, bool):
             raise TypeError("collapse must be a bool, when True it will remove null columns")
+        if not isinstance(workers, int) or workers < 1:
+            raise ValueError("workers must be an int greater or equal to 1")
+        if move_sequence not in move_sequence_options:
+            raise ValueError("move_sequence must be one of: " + ", ".join(move_sequence_options))
+        if format not in format_options:
+            raise ValueError("format must be one of: " + ", ".join(format_options))
+        if not isinstance(timings, bool):
+            raise TypeError("timings must be a bool")
+        if progress is not None and not callable(progress):
+            raise TypeError("progress must be a function that takes a Progress object")
+        if progress_interval is not None and (not isinstance(progress_interval, (int, float)) or
+                                              progress_interval < 0):
+            raise ValueError("progress_interval must be a number of seconds greater or equal to 0")
+        if not isinstance(resume, bool):
+            raise TypeError("resume must be a bool")
+        if resume and (workers > 1 or format != FORMAT_CSV):
+            raise ValueError("resume is only supported when exporting csv files with 1 worker")
+        if not isinstance(incremental, bool):
+            raise TypeError("incremental must be a bool")
+        if incremental and (workers > 1 or format != FORMAT_CSV or collapse or resume):
+            raise ValueError("incremental is only supported when exporting csv files with 1 worker, "
+                             "without collapse or resume")
+        if compression is not None and compression not in compression_options:
+            raise ValueError("compression must be None or one of: " + ", ".join(compression_options))
+        if compression is not None and (format != FORMAT_CSV or resume or incremental):
+            raise ValueError("compression is only supported when exporting csv files, without resume or incremental")
+        if columns is not None:
+            if not isinstance(columns, list):
+                raise TypeError("columns must be a list of the columns of the moves file")
+            unknown_columns = [column for column in columns if column not in file_headers_moves]
+            if len(unknown_columns) > 0:
+                raise ValueError("columns not in the moves file: " + ", ".join(map(str, unknown_columns)))
+            if not moves_required:
+                raise ValueError("columns are the columns of the moves file, moves_required must be True")
+        if not isinstance(positions, bool):
+            raise TypeError("positions must be a bool")
+        if positions and (not moves_required or resume or incremental):
+            raise ValueError("positions is only supported when moves_required is True, without resume or incremental")
+        if not isinstance(index, bool):
+            raise TypeError("index must be a bool")
+        if index and (not moves_required or resume or incremental):
+            raise ValueError("index is only supported when moves_required is True, without resume or incremental")
+        if compression == "zstd" and importlib.util.find_spec("zstandard") is None:
+            raise ImportError("zstandard needs to be installed to compress the files with zstd: pip install zstandard")
 
         timer = TimeProcess()
         result = Result.get_empty_result()
@@ -69,77 +275,327 @@ class PGNData:
             return result
 
         full_file_name = self.__create_file_name(file_name) if self._file_name is None else self._file_name
-        result = self.__process_pgn_list(pgn_list, full_file_name, moves_required, queue_size, collapse)
+        result = self.__process_pgn_list(pgn_list, full_file_name, moves_required, queue_size, collapse, workers,
+                                         move_sequence, format, timings, progress, progress_interval, resume,
+                                         incremental, compression, columns, positions, index)
 
         timer.print_time_taken()
+        if timings:
+            print_stage_timings(result.stage_timings)
         return result
 
     @staticmethod
     def __create_file_name(file_path):
-        return ntpath.basename(file_path).replace(".pgn", "")
+        return get_pgn_file_name(file_path).replace(".pgn", "")
 
     def __process_pgn_list(self, file_list, output_file=None, moves_required=DEFAULT_MOVES_REQUIRED,
-                           queue_size=DEFAULT_QUEUE_SIZE, collapse=DEFAULT_COLLAPSE):
+                           queue_size=DEFAULT_QUEUE_SIZE, collapse=DEFAULT_COLLAPSE, workers=DEFAULT_WORKERS,
+                           move_sequence=DEFAULT_MOVE_SEQUENCE, file_format=DEFAULT_FORMAT, timings=DEFAULT_TIMINGS,
+                           progress=None, progress_interval=None, resume=DEFAULT_RESUME,
+                           incremental=DEFAULT_INCREMENTAL, compression=DEFAULT_COMPRESSION, columns=None,
+                           positions=DEFAULT_POSITIONS, index=DEFAULT_INDEX):
         """
         This takes a PGN file and creates two output files
         1. First file contains the game information
         2. Second file containing the moves
+        and a third file containing the positions of the moves, when positions is True,
+        and a SQLite file with the index of the games by their first moves, when index is True
         """
 
         log.info("Starting process..")
 
         result = Result.get_empty_result()
-
-        file_name_games = output_file + '_game_info.csv'
-        file_games = open_file(file_name_games)
+        process_options = self.__get_process_options(moves_required, queue_size, move_sequence, timings, progress,
+                                                     progress_interval, columns, positions)
+
+        # checkpoints are saved when exporting csv files with 1 worker, so the export can be resumed
+        # a compressed file can not be truncated to a checkpoint, so there are no checkpoints when it is compressed,
+        # nor with positions or index as the positions and games already written to them are not saved
+        # they are only saved when the export is resumable or the checkpoint interval is set
+        checkpoint_interval = self._checkpoint_interval
+        if checkpoint_interval is None:
+            checkpoint_interval = DEFAULT_CHECKPOINT_INTERVAL if resume else 0
+        checkpoint = None
+        resume_data = None
+        if workers == 1 and file_format == FORMAT_CSV and compression is None and not incremental and \
+                not positions and not index and (checkpoint_interval > 0 or resume):
+            checkpoint = Checkpoint(output_file + "_checkpoint.json", file_list,
+                                    self.__get_checkpoint_options(process_options, collapse))
+            resume_data = checkpoint.load() if resume else None
+            if resume and resume_data is None:
+                log.info("No checkpoint found for {}, starting the export from the beginning".format(output_file))
+
+        extension = get_file_extension(file_format, compression)
+        file_name_games = output_file + '_game_info' + extension
+        file_name_moves = output_file + '_moves' + extension if moves_required else None
+        file_name_positions = output_file + '_positions' + extension if positions else None
+        file_name_index = output_file + '_index.sqlite' if index else None
+
+        # each job is a tuple of: index of the pgn file, byte position to start from, game order of the first game
+        jobs = [(file_index, 0, 1) for file_index in range(len(file_list))]
+        if resume_data is not None:
+            jobs = [(resume_data["file_index"], resume_data["offset"], resume_data["game_order"])] + \
+                   [(file_index, 0, 1) for file_index in range(resume_data["file_index"] + 1, len(file_list))]
+            jobs = [job for job in jobs if job[0] < len(file_list)]
+
+        manifest = None
+        is_appending = False
+        if incremental:
+            manifest = Manifest(output_file + "_manifest.json", self.__get_checkpoint_options(process_options, False))
+            if manifest.load() and os.path.isfile(file_name_games) and \
+                    (not moves_required or os.path.isfile(file_name_moves)):
+                jobs = self.__get_incremental_jobs(manifest, file_list, file_name_games, file_name_moves)
+                is_appending = True
+            else:
+                manifest.files = {}
+
+        if is_appending:
+            file_games = open_file(file_name_games, mode='a', buffer_size=self._buffer_size)
+            file_moves = open_file(file_name_moves, mode='a', buffer_size=self._buffer_size) if moves_required else None
+        elif resume_data is None:
+            file_games = self.__open_output_file(file_name_games, file_format, compression, self._buffer_size,
+                                                 self._game_id_type)
+            file_moves = self.__open_output_file(file_name_moves, file_format, compression, self._buffer_size,
+                                                 self._game_id_type) \
+                if moves_required else None
+        else:
+            log.info("Resuming the export from game {} of {}".format(resume_data["game_order"],
+                                                                   file_list[min(resume_data["file_index"],
+                                                                                 len(file_list) - 1)]))
+            file_games = self.__open_resumed_file(file_name_games, resume_data["games_size"], self._buffer_size)
+            file_moves = self.__open_resumed_file(file_name_moves, resume_data["moves_size"], self._buffer_size) \
+                if moves_required else None
 
         if moves_required:
-            file_name_moves = output_file + '_moves.csv'
-            file_moves = open_file(file_name_moves)
             export_files_initialized = (file_games is not None) and (file_moves is not None)
         else:
-            file_name_moves, file_moves = None, None
             export_files_initialized = file_games is not None
 
         if not export_files_initialized:
             log.info("Could not initialize the csv files to export the data into!")
             return result
 
-        add_headers = True
-        for file in file_list:
-            process = Process(file, file_games, file_moves, self._engine_path, self._depth, moves_required, queue_size)
-            process.parse_file(add_headers)
-            add_headers = False
+        file_positions = self.__open_output_file(file_name_positions, file_format, compression, self._buffer_size,
+                                                 self._game_id_type) if positions else None
+        game_index = None
+        if index:
+            # the index of a previous export is replaced, like the other output files
+            if os.path.isfile(file_name_index):
+                os.remove(file_name_index)
+            game_index = GameIndex(file_name_index, self._index_depth)
+
+        # the columns that stay empty are tracked as the rows are written, so they can be removed afterwards
+        if collapse:
+            column_states = resume_data["columns"] if resume_data is not None else {}
+            file_games = ColumnTracker(file_games, column_states.get("games"))
+            file_moves = ColumnTracker(file_moves, column_states.get("moves")) if moves_required else None
+
+        statistics = {}
+        if workers > 1:
+            parallel_process = ParallelProcess(file_list, file_games, file_moves, workers, process_options,
+                                               self._split_size, file_positions, game_index)
+            parallel_process.parse_files()
+            statistics = parallel_process.statistics
+        else:
+            add_headers = resume_data is None and not is_appending
+            if resume_data is not None:
+                statistics = resume_data["statistics"]
+            # the positions written from the previous files are not written again
+            position_ids = set()
+            file_occurrences = get_file_occurrences(file_list)
+            for file_index, start, first_order in jobs:
+                # the size and hash are taken before the conversion, in case games are added to the file during it
+                size = os.path.getsize(file_list[file_index]) if manifest is not None else None
+                # the range of a compressed file is in the decompressed data, so it is read to its end
+                end = size if not is_compressed(file_list[file_index]) else None
+                file_hash = get_file_hash(file_list[file_index]) if manifest is not None else None
+                checkpoint_options = {}
+                if checkpoint is not None and checkpoint_interval > 0:
+                    checkpoint_options = {"checkpoint_interval": checkpoint_interval,
+                                          "checkpoint_callback": partial(self.__save_checkpoint, checkpoint,
+                                                                         file_index, file_games, file_moves,
+                                                                         statistics)}
+                process = Process(file_list[file_index], file_games, file_moves, start=start, end=end,
+                                  first_order=first_order, file_positions=file_positions, position_ids=position_ids,
+                                  game_index=game_index, file_occurrence=file_occurrences[file_index],
+                                  **process_options, **checkpoint_options)
+                process.parse_file(add_headers)
+                process_statistics = process.get_statistics()
+                if manifest is not None:
+                    # only the games converted in this export are counted, not the games of the previous exports
+                    process_statistics["game_count"] -= first_order - 1
+                add_statistics(statistics, process_statistics)
+                add_headers = False
+                if checkpoint is not None:
+                    self.__save_checkpoint(checkpoint, file_index + 1, file_games, file_moves, statistics, 0, 1)
+                if manifest is not None:
+                    self.__save_manifest(manifest, file_list[file_index], size, file_hash, process.game_count,
+                                         file_games, file_moves)
 
         file_games.close()
         if moves_required:
             file_moves.close()
+        if positions:
+            file_positions.close()
+        if index:
+            game_index.close()
 
         # remove any null columns
         if collapse:
-            self.__remove_empty_columns(file_name_games)
-            self.__remove_empty_columns(file_name_moves)
+            self.__remove_empty_columns(file_games)
+            if moves_required:
+                self.__remove_empty_columns(file_moves)
+
+        if checkpoint is not None:
+            checkpoint.remove()
 
         # return a result object to indicate outcome
-        result = self.__get_result_of_output_files(file_name_games, file_name_moves, moves_required)
+        result = self.__get_result_of_output_files(file_name_games, file_name_moves, moves_required, statistics,
+                                                   file_name_positions, file_name_index)
 
         log.info("ending process..")
         return result
 
+    def __get_process_options(self, moves_required, queue_size, move_sequence, timings, progress, progress_interval,
+                              columns, positions):
+        """
+        keyword arguments for each Process, they need to be picklable as they are passed to the workers
+        the progress is only reported when a progress function or interval is given
+        """
+        if progress_interval is None:
+            progress_interval = DEFAULT_PROGRESS_INTERVAL if progress is not None else 0
+        return {"engine_path": self._engine_path,
+                "engine_depth": self._depth,
+                "moves_required": moves_required,
+                "queue_size": queue_size,
+                "engine_count": self._engine_count,
+                "eval_cache_path": self._eval_cache_path,
+                "eval_cache_size": self._eval_cache_size,
+                "fen_row_cache_size": self._fen_row_cache_size,
+                "move_sequence": move_sequence,
+                "timings": timings,
+                "progress_interval": progress_interval,
+                "progress_callback": progress,
+                "game_filter": self._game_filter,
+                "move_columns": columns,
+                "game_id_type": self._game_id_type,
+                "positions": positions}
+
     @staticmethod
-    def __remove_empty_columns(file_name):
-        # Load the CSV file
-        if isinstance(file_name, str):
-            if os.path.isfile(file_name):
-                df = pd.read_csv(file_name)
+    def __get_checkpoint_options(process_options, collapse):
+        """
+        the options that change the output files, an export can only be resumed with the same options
+        """
+        options = {key: process_options[key] for key in ["moves_required", "engine_path", "engine_depth",
+                                                          "move_sequence"]}
+        options["collapse"] = collapse
+        # these are only added when they are set, so the checkpoints and manifests saved without them are still used
+        if process_options["game_filter"] is not None:
+            options["game_filter"] = process_options["game_filter"].get_options()
+        if process_options["move_columns"] is not None:
+            options["move_columns"] = process_options["move_columns"]
+        if process_options["game_id_type"] != GAME_ID_UUID:
+            options["game_id_type"] = process_options["game_id_type"]
+        return options
+
+    def __get_incremental_jobs(self, manifest, file_list, file_name_games, file_name_moves):
+        """
+        returns the jobs of the pgn files that are new or have changed since the last export
+        the output files are truncated to their sizes when the manifest was saved, and the rows of the files
+        that have changed are removed, so they are converted again
+        """
+        os.truncate(file_name_games, manifest.games_size)
+        if file_name_moves is not None:
+            os.truncate(file_name_moves, manifest.moves_size)
+
+        jobs = []
+        changed_file_names = set()
+        for file_index, file in enumerate(file_list):
+            change, entry = manifest.get_change(file)
+            if change == FILE_UNCHANGED:
+                log.info("skipping file already converted: {}".format(file))
+            elif change == FILE_APPENDED:
+                log.info("converting the games added to file: {}".format(file))
+                jobs.append((file_index, entry["size"], entry["game_count"] + 1))
+            else:
+                if change != FILE_NEW:
+                    changed_file_names.add(get_pgn_file_name(file))
+                jobs.append((file_index, 0, 1))
+
+        # rows are matched to their pgn file by the file name, so every file with the same name is converted again
+        for file_name in changed_file_names:
+            log.info("removing the games of changed file: {}".format(file_name))
+            remove_game_rows(file_name_games, file_name_moves, file_name)
+            for file in [file for file in manifest.files if get_pgn_file_name(file) == file_name]:
+                manifest.remove(file)
+        for index, (file_index, start, first_order) in enumerate(jobs):
+            if get_pgn_file_name(file_list[file_index]) in changed_file_names:
+                jobs[index] = (file_index, 0, 1)
+        for file_index, file in enumerate(file_list):
+            if get_pgn_file_name(file) in changed_file_names and file_index not in [job[0] for job in jobs]:
+                jobs.append((file_index, 0, 1))
+        return sorted(jobs)
+
+    @staticmethod
+    def __save_manifest(manifest, pgn_file, size, file_hash, game_count, file_games, file_moves):
+        file_games.flush()
+        if file_moves is not None:
+            file_moves.flush()
+        manifest.update(pgn_file, size, os.stat(pgn_file).st_mtime, file_hash, game_count)
+        manifest.games_size = os.path.getsize(file_games.name)
+        manifest.moves_size = os.path.getsize(file_moves.name) if file_moves is not None else 0
+        manifest.save()
+
+    @staticmethod
+    def __save_checkpoint(checkpoint, file_index, file_games, file_moves, statistics, offset, game_order,
+                          process_statistics=None):
+        """
+        the output files are flushed first, so their sizes include all the games before the offset
+        process_statistics are the counters of the file being converted, up to the offset
+        """
+        file_games.flush()
+        if file_moves is not None:
+            file_moves.flush()
+        if process_statistics is not None:
+            statistics = add_statistics(add_statistics({}, statistics), process_statistics)
+        column_states = {}
+        if isinstance(file_games, ColumnTracker):
+            column_states["games"] = file_games.get_state()
+        if isinstance(file_moves, ColumnTracker):
+            column_states["moves"] = file_moves.get_state()
+        checkpoint.save(file_index, offset, game_order, os.path.getsize(file_games.name),
+                        os.path.getsize(file_moves.name) if file_moves is not None else 0, statistics, column_states)
 
-                # Remove columns where all values are NaN
-                df = df.dropna(axis=1, how='all')
+    @staticmethod
+    def __open_resumed_file(file_name, size, buffer_size):
+        """
+        the rows written after the checkpoint are removed, and the file is opened to add the rows after them
+        """
+        if not os.path.isfile(file_name) or os.path.getsize(file_name) < size:
+            log.error("The file {} is missing or smaller than at the checkpoint, "
+                      "it can not be resumed".format(file_name))
+            return None
+        os.truncate(file_name, size)
+        return open_file(file_name, mode='a', buffer_size=buffer_size)
 
-                # Overwrite the original CSV file
-                df.to_csv(file_name, index=False)
+    @staticmethod
+    def __open_output_file(file_name, file_format, compression, buffer_size, game_id_type):
+        if file_format == FORMAT_PARQUET:
+            return ParquetWriter(file_name, types={"game_id": "int64"} if game_id_type == GAME_ID_INT else None)
+        return open_file(file_name, compression=compression_options.get(compression), buffer_size=buffer_size)
 
-                del df
+    @staticmethod
+    def __remove_empty_columns(column_tracker):
+        """
+        the file is rewritten once without the empty columns, streaming it so memory does not grow with its size
+        """
+        empty_columns = column_tracker.get_empty_columns()
+        if len(empty_columns) > 0 and os.path.isfile(column_tracker.name):
+            log.info("removing empty columns from {}: {}".format(column_tracker.name, ", ".join(empty_columns)))
+            if column_tracker.name.endswith(get_file_extension(FORMAT_PARQUET)):
+                remove_parquet_columns(column_tracker.name, empty_columns)
+            else:
+                remove_csv_columns(column_tracker.name, empty_columns)
 
     @staticmethod
     def __is_valid_pgn_list(file_list):
@@ -151,10 +607,14 @@ class PGNData:
                 if not os.path.isfile(file):
                     log.error("file not found:" + file)
                     return False
+                if get_compression(file) == ".zst" and importlib.util.find_spec("zstandard") is None:
+                    log.error("zstandard needs to be installed to read .zst files: " + file)
+                    return False
             return True
         return False
 
-    def __get_result_of_output_files(self, game_file_name, moves_file_name=None, moves_required=DEFAULT_MOVES_REQUIRED) -> Result:
+    def __get_result_of_output_files(self, game_file_name, moves_file_name=None, moves_required=DEFAULT_MOVES_REQUIRED,
+                                     statistics=None, positions_file_name=None, index_file_name=None) -> Result:
         result = Result.get_empty_result()
 
         try:
@@ -171,7 +631,21 @@ class PGNData:
                 is_files_exists = is_games_file_exists
                 move_result = None
 
-            result = Result(is_files_exists, game_result, move_result)
+            positions_result = None
+            if positions_file_name is not None:
+                is_positions_file_exists = os.path.isfile(positions_file_name)
+                positions_size = self.__get_size(positions_file_name) if is_positions_file_exists else 0
+                positions_result = ResultFile(positions_file_name, positions_size)
+                is_files_exists = is_files_exists and is_positions_file_exists
+
+            index_result = None
+            if index_file_name is not None:
+                is_index_file_exists = os.path.isfile(index_file_name)
+                index_size = self.__get_size(index_file_name) if is_index_file_exists else 0
+                index_result = ResultFile(index_file_name, index_size)
+                is_files_exists = is_files_exists and is_index_file_exists
+
+            result = Result(is_files_exists, game_result, move_result, statistics, positions_result, index_result)
         except Exception as e:
             log.error(e)
             pass
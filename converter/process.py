@@ -1,21 +1,52 @@
-import csv
 import logging
-import ntpath
+import os.path
 import queue
 import uuid
+from collections import Counter
 from threading import Thread
+from timeit import default_timer as timer
 
 import chess
 import chess.pgn
-import chess.engine
 
-from common.log_time import get_time_stamp
+from common.cache import LRUCache
+from common.common import get_hash_key
+from common.log_time import get_time_stamp, StageTimer
+from common.pgn_reader import open_pgn, get_read_position, get_pgn_file_name, is_compressed
+from converter.engine import EnginePool
+from converter.eval_cache import EvaluationCache, DEFAULT_EVAL_CACHE_SIZE
 from converter.fen import FenStats
-from converter.headers import file_headers_game, file_headers_moves, file_headers_stockfish
+from converter.game_filter import FilteredGameBuilder
+from converter.game_state import GameState
+from converter.headers import file_headers_game, file_headers_moves, file_headers_stockfish, \
+    file_headers_positions
+from converter.progress import ProgressReporter
+from converter.writer import get_writer
 
 log = logging.getLogger("pgn2data - process")
 logging.basicConfig(level=logging.INFO)
 
+DEFAULT_FEN_ROW_CACHE_SIZE = 100000
+
+# options for the move_sequence column in the moves file
+MOVE_SEQUENCE_FULL = "full"  # sequence of moves up to the current move on every row
+MOVE_SEQUENCE_LAST = "last"  # sequence of all the moves of a game on the last row of the game only
+MOVE_SEQUENCE_NONE = "none"  # column is not created
+move_sequence_options = [MOVE_SEQUENCE_FULL, MOVE_SEQUENCE_LAST, MOVE_SEQUENCE_NONE]
+
+# options for the game_id column
+GAME_ID_UUID = "uuid"  # random uuid, different on every export
+GAME_ID_INT = "int"  # integer from the path of the pgn file and the position of the game, the same on every export
+game_id_options = [GAME_ID_UUID, GAME_ID_INT]
+
+# columns of the moves file that are taken from the fen stats of the position
+fen_stats_columns = file_headers_positions[1:]
+piece_count_columns = file_headers_moves[file_headers_moves.index("white_pawn_count"):
+                                         file_headers_moves.index("captured_score_for_black") + 1]
+fen_row_columns = [header for header in file_headers_moves if header.startswith("fen_row")]
+# pieces in the order of their columns, each with a white and a black column
+counted_pieces = [chess.PAWN, chess.QUEEN, chess.BISHOP, chess.KNIGHT, chess.ROOK]
+
 
 class PlayerMove:
     """
@@ -48,16 +79,78 @@ class PlayerMove:
 class Process:
     """
     Handles the pgn to data conversion
+    start and end are byte positions, which are used to convert only part of the pgn file
+    engine_count is the number of engines used to evaluate the moves concurrently
+    eval_cache_path is the SQLite file used to cache the engine evaluations between runs
+    fen_row_cache_size is the number of fen rows kept with their counts and valuations
+    move_sequence is one of the move_sequence_options
+    timings enables the timers of each stage of the conversion
+    progress_interval is the number of seconds between progress reports, which are passed to progress_callback
+    or logged if there is no callback, 0 turns them off
+    first_order is the game_order of the first game, used when a conversion is resumed from a checkpoint
+    checkpoint_callback is called every checkpoint_interval seconds, when all the games read have been written,
+    with the byte position of the next game in the pgn file, its game order and the statistics of the games before it
+    game_filter is a GameFilter that selects the games converted, the games it does not select are skipped
+    after their headers are read, but they are still counted in the game order and game_count
+    move_columns is the list of the columns of the moves file that are written, None writes all of them.
+    The values of the other columns are not calculated.
+    game_id_type is one of game_id_options
+    positions writes the fen and the columns calculated from it into file_positions, once for each position,
+    and the moves file has the position_id of the position in their place. position_ids is the set of the ids
+    of the positions already written, which is shared when several pgn files are converted into the same files
+    game_index is a GameIndex, the first moves of each game are added to it
+    file_occurrence is the number of times the pgn file is in the list of files converted before this one,
+    it is part of the integer game ids so the games of a file listed twice have different ids
     """
 
-    def __init__(self, pgn_file, file_games, file_moves, engine_path, engine_depth, moves_required, queue_size=0):
+    def __init__(self, pgn_file, file_games, file_moves, engine_path, engine_depth, moves_required, queue_size=0,
+                 start=0, end=None, engine_count=1, eval_cache_path=None, eval_cache_size=DEFAULT_EVAL_CACHE_SIZE,
+                 fen_row_cache_size=DEFAULT_FEN_ROW_CACHE_SIZE, move_sequence=MOVE_SEQUENCE_FULL,
+                 timings=False, progress_interval=0, progress_callback=None, first_order=1,
+                 checkpoint_interval=0, checkpoint_callback=None, game_filter=None, move_columns=None,
+                 game_id_type=GAME_ID_UUID, positions=False, file_positions=None, position_ids=None,
+                 game_index=None, file_occurrence=0):
         self.pgn_file = pgn_file
+        self.start = start
+        self.end = end
+        self.game_count = 0
+        self.filtered_count = 0
         self.file_games = file_games
         self.file_moves = file_moves
         self.engine_path = engine_path
         self.engine_depth = engine_depth
+        self.engine_count = engine_count
+        self.eval_cache_path = eval_cache_path
+        self.eval_cache_size = eval_cache_size
+        self.eval_cache_hits = 0
+        self.eval_cache_misses = 0
+        self.fen_row_cache = LRUCache(fen_row_cache_size)
+        self.move_sequence = move_sequence
+        self.stage_timer = StageTimer(timings)
+        if is_compressed(pgn_file):
+            # the progress of a compressed file is measured in the compressed file
+            self.progress = ProgressReporter(pgn_file, 0, None, progress_interval, progress_callback)
+        else:
+            self.progress = ProgressReporter(pgn_file, start, end, progress_interval, progress_callback)
+        self.first_order = first_order
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_callback = checkpoint_callback
         self.max_queue_size = queue_size
         self.moves_required = moves_required
+        self.game_filter = game_filter
+        self.__game_builder = None
+        self.move_columns = move_columns
+        self.positions = positions
+        self.file_positions = file_positions
+        self.position_ids = position_ids if position_ids is not None else set()
+        self.position_count = 0
+        self.__positions_writer = None
+        self.__move_error = None
+        self.game_index = game_index
+        self.__set_move_columns(move_columns)
+        self.game_id_type = game_id_type
+        self.__pgn_path = os.path.abspath(pgn_file)
+        self.file_occurrence = file_occurrence
 
     def parse_file(self, add_headers_flag=True):
         """
@@ -69,6 +162,22 @@ class Process:
         else:
             self.__parse_file_games(add_headers_flag)
 
+    def get_statistics(self):
+        """
+        counters of the conversion, these are added together for all the files into the Result
+        """
+        statistics = {"game_count": self.game_count,
+                      "filtered_count": self.filtered_count,
+                      "position_count": self.position_count,
+                      "eval_cache_hits": self.eval_cache_hits,
+                      "eval_cache_misses": self.eval_cache_misses,
+                      "fen_row_cache_hits": self.fen_row_cache.hits,
+                      "fen_row_cache_misses": self.fen_row_cache.misses,
+                      "fen_row_cache_size": self.fen_row_cache.size}
+        if self.stage_timer.enabled:
+            statistics["stage_timings"] = self.stage_timer.get_statistics()
+        return statistics
+
     def __parse_file_games(self, add_headers_flag=True):
         """
         processes the pgn file and then exports game information
@@ -76,21 +185,44 @@ class Process:
         """
 
         log.info("Processing games only in file:{}".format(self.pgn_file))
-        pgn = open(self.pgn_file, encoding="UTF-8")
+        pgn = open_pgn(self.pgn_file, self.start, self.end)
 
-        game_writer = csv.writer(self.file_games, delimiter=',')
+        game_writer = get_writer(self.file_games)
         if add_headers_flag:
             game_writer.writerow(file_headers_game)
 
-        order = 1
-        while True:
-            game_id = str(uuid.uuid4())
-            game = chess.pgn.read_game(pgn)
-            if game is None:
-                break  # end of file
-
-            game_writer.writerow(self.__get_game_row_data(game, game_id, order, self.pgn_file))
-            order += 1
+        stage_timer = self.stage_timer
+        progress = self.progress
+        progress.start_reports()
+        checkpoint_time = timer()
+        order = self.first_order
+        try:
+            while True:
+                with stage_timer.time("read_headers"):
+                    headers = self.__read_headers(pgn)
+                if headers is None:
+                    break  # end of file
+
+                if self.game_filter is not None and not self.game_filter.is_match(headers):
+                    self.filtered_count += 1
+                else:
+                    game_id = self.__get_game_id(pgn)
+                    with stage_timer.time("game_row"):
+                        row_data = self.__get_game_row_data(headers, game_id, order, self.pgn_file)
+                    with stage_timer.time("write_games"):
+                        game_writer.writerow(row_data)
+                progress.offset = get_read_position(pgn)
+                progress.games_read = progress.games = order - self.first_order + 1 - self.filtered_count
+                order += 1
+
+                if self.checkpoint_callback is not None and timer() - checkpoint_time >= self.checkpoint_interval:
+                    self.__save_checkpoint(pgn, order)
+                    checkpoint_time = timer()
+        finally:
+            # the reports are stopped and the file closed when the conversion fails, as well as when it completes
+            progress.stop_reports()
+            pgn.close()
+        self.game_count = order - 1
 
     def __parse_file_games_and_moves(self, add_headers_flag=True):
         """
@@ -99,43 +231,155 @@ class Process:
         """
 
         log.info("Processing games and moves in file:{}".format(self.pgn_file))
-        pgn = open(self.pgn_file, encoding="UTF-8")
-
-        engine = None
-        if self.engine_path is not None:
-            engine = chess.engine.SimpleEngine.popen_uci(self.engine_path)
+        pgn = open_pgn(self.pgn_file, self.start, self.end)
 
         q = queue.Queue(maxsize=self.max_queue_size)
         worker = Thread(target=self.__process_move_queue, args=(q,))
         worker.setDaemon(True)
         worker.start()
 
-        move_writer = csv.writer(self.file_moves, delimiter=',')
+        move_writer = get_writer(self.file_moves)
         if add_headers_flag:
-            headers = file_headers_moves
-            if engine is not None:
-                headers.extend(file_headers_stockfish)
+            headers = self.__move_headers
+            if self.engine_path is not None:
+                headers = headers + file_headers_stockfish
             move_writer.writerow(headers)
 
-        game_writer = csv.writer(self.file_games, delimiter=',')
+        game_writer = get_writer(self.file_games)
         if add_headers_flag:
             game_writer.writerow(file_headers_game)
 
-        order = 1
-        while True:
-            game_id = str(uuid.uuid4())
-            game = chess.pgn.read_game(pgn)
-            if game is None:
-                break  # end of file
+        if self.positions:
+            self.__positions_writer = get_writer(self.file_positions)
+            if add_headers_flag:
+                self.__positions_writer.writerow(file_headers_positions)
+
+        engine = None
+        if self.engine_path is not None:
+            cache = None
+            if self.eval_cache_path is not None:
+                cache = EvaluationCache(self.eval_cache_path, self.eval_cache_size)
+            engine = EnginePool(self.engine_path, self.engine_count, cache)
+
+        stage_timer = self.stage_timer
+        progress = self.progress
+        progress.get_backlog = q.qsize
+        progress.start_reports()
+        checkpoint_time = timer()
+        game_builder = self.__get_game_builder if self.game_filter is not None else chess.pgn.GameBuilder
+        order = self.first_order
+        try:
+            while True:
+                with stage_timer.time("read_game"):
+                    game = chess.pgn.read_game(pgn, Visitor=game_builder)
+                if game is None:
+                    break  # end of file
+
+                if self.game_filter is not None and self.__game_builder.is_rejected:
+                    self.filtered_count += 1
+                else:
+                    game_id = self.__get_game_id(pgn)
+                    with stage_timer.time("game_row"):
+                        row_data = self.__get_game_row_data(game.headers, game_id, order, self.pgn_file)
+                    with stage_timer.time("write_games"):
+                        game_writer.writerow(row_data)
+                    # this is the time waiting for the moves of previous games when the queue is full
+                    with stage_timer.time("queue_wait"):
+                        q.put((game_id, game, move_writer, engine, self.engine_depth))
+                    if self.__move_error is not None:
+                        self.__join_move_queue(q)
+                progress.offset = get_read_position(pgn)
+                progress.games_read = order - self.first_order + 1 - self.filtered_count
+                order += 1
+
+                if self.checkpoint_callback is not None and timer() - checkpoint_time >= self.checkpoint_interval:
+                    # the moves of all the games read are written first, so the output files end with a whole game
+                    self.__join_move_queue(q)
+                    self.__save_checkpoint(pgn, order, engine)
+                    checkpoint_time = timer()
+
+            self.__join_move_queue(q)
+        finally:
+            # the engines and the evaluation cache are closed when the conversion fails, as well as when it completes
+            progress.stop_reports()
+            pgn.close()
+            if engine is not None:
+                engine.quit()
+        self.game_count = order - 1
 
-            game_writer.writerow(self.__get_game_row_data(game, game_id, order, self.pgn_file))
-            q.put((game_id, game, move_writer, engine, self.engine_depth))
-            order += 1
+        if engine is not None and engine.cache is not None:
+            self.eval_cache_hits = engine.cache.hits
+            self.eval_cache_misses = engine.cache.misses
 
-        q.join()
+    def __save_checkpoint(self, pgn, order, engine=None):
+        """
+        the counters of the evaluation cache are copied first, so they are in the statistics of the checkpoint
+        """
+        if engine is not None and engine.cache is not None:
+            self.eval_cache_hits = engine.cache.hits
+            self.eval_cache_misses = engine.cache.misses
+        self.file_games.flush()
+        if self.file_moves is not None:
+            self.file_moves.flush()
+        self.checkpoint_callback(pgn.tell(), order, self.get_statistics())
+
+    def __set_move_columns(self, move_columns):
+        """
+        sets the headers of the moves file, and which values need to be calculated for the columns written
+        """
+        headers = file_headers_moves
+        if self.move_sequence == MOVE_SEQUENCE_NONE:
+            headers = [header for header in headers if header != "move_sequence"]
+        # indexes of the columns written in a row of all the columns, None when all the columns are written
+        self.__move_column_indexes = None
+        if move_columns is not None or self.positions:
+            self.__move_column_indexes = [index for index, header in enumerate(headers)
+                                          if self.__is_move_column_written(header, move_columns)]
+            headers = [headers[index] for index in self.__move_column_indexes]
+        if self.positions:
+            headers = ["position_id" if header == "fen" else header for header in headers]
+        self.__move_headers = headers
+        self.__is_move_column = {header: header in headers for header in file_headers_moves}
+        self.__is_fen_stats_required = any(self.__is_move_column[header] for header in fen_stats_columns)
+        self.__is_piece_count_required = any(self.__is_move_column[header] for header in piece_count_columns)
+        self.__is_fen_row_required = any(self.__is_move_column[header] for header in fen_row_columns)
+        self.__is_notation_required = self.__is_move_column["notation"] or self.__is_move_column["move_sequence"]
+
+    def __is_move_column_written(self, header, move_columns):
+        if self.positions and header in fen_stats_columns:
+            # the fen column has the id of the position instead, the other columns are in the positions file
+            return header == "fen"
+        return move_columns is None or header in move_columns or header == "game_id"
+
+    def __get_game_id(self, pgn):
+        """
+        the id of the game that was just read, the integer id uses the position of the end of the game in the file,
+        which is the same when the file is converted in parts or resumed from a checkpoint.
+        The full path of the file is used, so files with the same name in different folders have different ids
+        """
+        if self.game_id_type == GAME_ID_INT:
+            return get_game_key(self.__pgn_path, pgn.tell(), self.file_occurrence)
+        return str(uuid.uuid4())
 
-        if engine is not None:
-            engine.quit()
+    def __get_game_builder(self):
+        """
+        the builder of the game being read is kept, to know if the filter selected the game
+        """
+        self.__game_builder = FilteredGameBuilder(self.game_filter)
+        return self.__game_builder
+
+    @staticmethod
+    def __read_headers(pgn):
+        """
+        reads the headers of the next game, the movetext is skipped without parsing the moves
+        the headers start with the same defaults as the headers of a game read by chess.pgn.read_game
+        """
+        pgn_headers = chess.pgn.read_headers(pgn)
+        if pgn_headers is None:
+            return None
+        headers = chess.pgn.Headers()
+        headers.update(pgn_headers)
+        return headers
 
     def __process_move_queue(self, q):
         """
@@ -143,44 +387,88 @@ class Process:
         """
         while True:
             item = q.get()
-            # game_id | game | move_writer | engine | engine_depth
-            self.__process_move(item[0], item[1], item[2], item[3], item[4])
-            q.task_done()
+            try:
+                # game_id | game | move_writer | engine | engine_depth
+                if self.__move_error is None:
+                    ply_count = self.__process_move(item[0], item[1], item[2], item[3], item[4])
+                    self.progress.plies += ply_count
+                    self.progress.games += 1
+            except Exception as e:
+                # the error is raised by the thread reading the games, the games left in the queue are skipped
+                self.__move_error = e
+            finally:
+                q.task_done()
+
+    def __join_move_queue(self, q):
+        """
+        waits for the moves of all the games read, and raises the error of the moves thread if there was one
+        """
+        q.join()
+        if self.__move_error is not None:
+            raise self.__move_error
 
     def __process_move(self, game_id, game, moves_writer, engine, depth):
         """
-        process all the moves in a game
+        process all the moves in a game, returns the number of moves
         """
         board = game.board()
+        start_fen = board.fen()
+        state = GameState(board, self.__is_move_column["is_fivefold_repetition"] or
+                          self.__is_move_column["is_game_over"])
         order_number = 1
         players_order_number = 1
         sequence = ""
+        notations = []
+        rows = []
+        # the first moves of the game and the positions after them, which are added to the game index
+        index_depth = self.game_index.depth if self.game_index is not None else 0
+        index_moves = []
+        index_positions = []
 
         # track stockfish evaluation
         white_eval = 0
         black_eval = 0
+        stage_timer = self.stage_timer
+        evaluations = []
+        if engine is not None:
+            with stage_timer.time("engine"):
+                evaluations = self.__get_game_evaluations(game, engine, depth)
 
+        is_notation_required = self.__is_notation_required
+        is_sequence_required = self.__is_move_column["move_sequence"]
+        is_piece_required = self.__is_move_column["piece"]
         for move in game.mainline_moves():
-            notation = board.san(move)
-            board.push(move)
+            notation = ""
+            if is_notation_required:
+                with stage_timer.time("san"):
+                    notation = board.san(move)
+            with stage_timer.time("push"):
+                state.push(move)
             player_move = PlayerMove(move, notation)
 
             # this gets the name of the piece that was moved
             try:
                 index = chess.SQUARE_NAMES.index(player_move.get_to_square())
             except ValueError as e:
-                log.error(f"Error: {notation} is an invalid move.")
+                log.error(f"Error: {notation if is_notation_required else move} is an invalid move.")
                 break
-            p = board.piece_at(chess.SQUARES[index])
-
-            player_move.set_piece(str(p))
-            sequence += ("|" if len(sequence) > 0 else "") + str(notation)
+            if is_piece_required:
+                p = board.piece_at(chess.SQUARES[index])
+                player_move.set_piece(str(p))
+            if is_sequence_required:
+                notations.append(str(notation))
+                if self.move_sequence == MOVE_SEQUENCE_FULL:
+                    sequence += ("|" if len(sequence) > 0 else "") + str(notation)
 
             # output the data about the move to the file
-            row_data, prev_eval, is_white = self.__get_move_row_data(player_move, board, game_id, game, order_number,
+            pov_score = evaluations[order_number - 1] if engine is not None else None
+            row_data, prev_eval, is_white = self.__get_move_row_data(player_move, state, game_id, game, order_number,
                                                                      players_order_number, sequence, engine, depth,
-                                                                     white_eval, black_eval)
-            moves_writer.writerow(row_data)
+                                                                     pov_score, white_eval, black_eval)
+            rows.append(row_data)
+            if order_number <= index_depth:
+                index_moves.append(str(move))
+                index_positions.append(board.board_fen())
 
             # this is tracking the move numbers in the game
             players_order_number += 1 if (order_number % 2) == 0 else 0
@@ -191,72 +479,124 @@ class Process:
             white_eval = prev_eval if is_white else white_eval
             black_eval = prev_eval if not is_white else black_eval
 
-    def __get_game_row_data(self, game, game_id, order, file_name):
+        # the sequence is only joined once, so it takes linear time to build
+        if self.move_sequence == MOVE_SEQUENCE_LAST and is_sequence_required and len(rows) > 0:
+            rows[-1][self.__move_headers.index("move_sequence")] = "|".join(notations)
+        with stage_timer.time("write_moves"):
+            moves_writer.writerows(rows)
+        if self.game_index is not None:
+            with stage_timer.time("index"):
+                self.game_index.add_game(game_id, start_fen, index_moves, index_positions)
+        return len(rows)
+
+    @staticmethod
+    def __get_game_evaluations(game, engine, depth):
         """
-        takes a "game" object and converts it into a list with the data for each column
+        evaluates every position of the game using the engine pool,
+        the positions are collected first so the pool can analyse them concurrently.
+        The boards keep the moves since the last capture or pawn move, so the engine sees the repetitions,
+        as the positions before them can not occur again
         """
+        board = game.board()
+        boards = []
+        for move in game.mainline_moves():
+            if not move:
+                break  # null moves end the processing of the game
+            board.push(move)
+            boards.append(board.copy(stack=board.halfmove_clock))
+        return engine.evaluate_positions(boards, depth)
 
-        winner = self.__get_winner(game)
+    def __get_game_row_data(self, headers, game_id, order, file_name):
+        """
+        takes the headers of a game and converts them into a list with the data for each column
+        """
+
+        winner = self.__get_winner(headers)
         loser = ""
         winner_elo = ""
         loser_elo = ""
         winner_loser_elo_diff = ""
 
-        if "White" in game.headers and "Black" in game.headers:
-            loser = game.headers["White"] if winner == game.headers["Black"] else (
-                game.headers["Black"] if winner == game.headers["White"] else winner)
-        if "WhiteElo" in game.headers and "BlackElo" in game.headers:
-            winner_elo = game.headers["WhiteElo"] if winner == game.headers["White"] else (
-                game.headers["BlackElo"] if winner == game.headers["Black"] else "")
-            loser_elo = game.headers["WhiteElo"] if winner == game.headers["Black"] else (
-                game.headers["BlackElo"] if winner == game.headers["White"] else "")
+        if "White" in headers and "Black" in headers:
+            loser = headers["White"] if winner == headers["Black"] else (
+                headers["Black"] if winner == headers["White"] else winner)
+        if "WhiteElo" in headers and "BlackElo" in headers:
+            winner_elo = headers["WhiteElo"] if winner == headers["White"] else (
+                headers["BlackElo"] if winner == headers["Black"] else "")
+            loser_elo = headers["WhiteElo"] if winner == headers["Black"] else (
+                headers["BlackElo"] if winner == headers["White"] else "")
             winner_loser_elo_diff = 0 if not (str(winner_elo).isnumeric() and str(loser_elo).isnumeric()) else int(
                 winner_elo) - int(loser_elo)
 
         return [game_id, order,
-                game.headers["Event"] if "Event" in game.headers else "",
-                game.headers["Site"] if "Site" in game.headers else "",
-                game.headers["Date"] if "Date" in game.headers else "",
-                game.headers["Round"] if "Round" in game.headers else "",
-                game.headers["White"] if "White" in game.headers else "",
-                game.headers["Black"] if "Black" in game.headers else "",
-                game.headers["Result"] if "Result" in game.headers else "",
-                game.headers["WhiteElo"] if "WhiteElo" in game.headers else "",
-                game.headers["WhiteRatingDiff"] if "WhiteRatingDiff" in game.headers else "",
-                game.headers["BlackElo"] if "BlackElo" in game.headers else "",
-                game.headers["BlackRatingDiff"] if "BlackRatingDiff" in game.headers else "",
-                game.headers["WhiteTitle"] if "WhiteTitle" in game.headers else "",
-                game.headers["BlackTitle"] if "BlackTitle" in game.headers else "",
+                headers["Event"] if "Event" in headers else "",
+                headers["Site"] if "Site" in headers else "",
+                headers["Date"] if "Date" in headers else "",
+                headers["Round"] if "Round" in headers else "",
+                headers["White"] if "White" in headers else "",
+                headers["Black"] if "Black" in headers else "",
+                headers["Result"] if "Result" in headers else "",
+                headers["WhiteElo"] if "WhiteElo" in headers else "",
+                headers["WhiteRatingDiff"] if "WhiteRatingDiff" in headers else "",
+                headers["BlackElo"] if "BlackElo" in headers else "",
+                headers["BlackRatingDiff"] if "BlackRatingDiff" in headers else "",
+                headers["WhiteTitle"] if "WhiteTitle" in headers else "",
+                headers["BlackTitle"] if "BlackTitle" in headers else "",
                 winner,
                 winner_elo,
                 loser,
                 loser_elo,
                 winner_loser_elo_diff,
-                game.headers["ECO"] if "ECO" in game.headers else "",
-                game.headers["Termination"] if "Termination" in game.headers else "",
-                game.headers["TimeControl"] if "TimeControl" in game.headers else "",
-                game.headers["UTCDate"] if "UTCDate" in game.headers else "",
-                game.headers["UTCTime"] if "UTCTime" in game.headers else "",
-                game.headers["Variant"] if "Variant" in game.headers else "",
-                game.headers["PlyCount"] if "PlyCount" in game.headers else "",
-                get_time_stamp(), ntpath.basename(file_name)]
-
-    __fen_row_counts_and_valuation_dict = {}
-
-    def __get_move_row_data(self, player_move, board, game_id, game, order_number, players_order_number, sequence,
-                            engine, depth, white_eval, black_eval):
+                headers["ECO"] if "ECO" in headers else "",
+                headers["Termination"] if "Termination" in headers else "",
+                headers["TimeControl"] if "TimeControl" in headers else "",
+                headers["UTCDate"] if "UTCDate" in headers else "",
+                headers["UTCTime"] if "UTCTime" in headers else "",
+                headers["Variant"] if "Variant" in headers else "",
+                headers["PlyCount"] if "PlyCount" in headers else "",
+                get_time_stamp(), get_pgn_file_name(file_name)]
+
+    def __get_move_row_data(self, player_move, state, game_id, game, order_number, players_order_number, sequence,
+                            engine, depth, pov_score, white_eval, black_eval):
         """
-        process each move in a game
+        process each move in a game, state is the GameState of the game after the move
         """
-
-        fen_stats = FenStats(board.board_fen())
-        white_count, black_count = fen_stats.get_total_piece_count()
-
-        if fen_stats.fen_position in self.__fen_row_counts_and_valuation_dict:
-            fen_row_valuations = self.__fen_row_counts_and_valuation_dict[fen_stats.fen_position]
-        else:
-            fen_row_valuations = fen_stats.get_fen_row_counts_and_valuation()
-            self.__fen_row_counts_and_valuation_dict[fen_stats.fen_position] = fen_row_valuations
+        board = state.board
+
+        # the values of the columns that are not written are left empty, without being calculated
+        is_column = self.__is_move_column
+        fen_position = ""
+        white_count, black_count = "", ""
+        piece_counts = [""] * len(piece_count_columns)
+        fen_row_values = [""] * len(fen_row_columns)
+        if self.__is_fen_stats_required:
+            with self.stage_timer.time("fen_stats"):
+                fen_stats = FenStats.from_board(board, self.fen_row_cache)
+                fen_position = fen_stats.fen_position
+                if is_column["white_count"] or is_column["black_count"]:
+                    white_count, black_count = fen_stats.get_total_piece_count()
+                if self.__is_piece_count_required:
+                    piece_counts = [fen_stats.get_piece_count(piece, color) for piece in counted_pieces
+                                    for color in [chess.WHITE, chess.BLACK]]
+                    piece_counts += [fen_stats.get_captured_score(chess.WHITE),
+                                     fen_stats.get_captured_score(chess.BLACK)]
+                if self.__is_fen_row_required:
+                    # the counts and values of white and black pieces of rows 1 to 8
+                    fen_row_valuations = fen_stats.get_fen_row_counts_and_valuation()
+                    fen_row_values = [fen_row_valuations[row][index] for index in range(4) for row in range(8)]
+        elif self.positions:
+            with self.stage_timer.time("fen_stats"):
+                fen_position = self.__get_position_id(board)
+
+        with self.stage_timer.time("terminal_checks"):
+            is_check = (1 if state.is_check() else 0) if is_column["is_check"] else ""
+            is_checkmate = (1 if state.is_checkmate() else 0) if is_column["is_check_mate"] else ""
+            is_fifty_moves = (1 if state.is_fifty_moves() else 0) if is_column["is_fifty_moves"] else ""
+            is_fivefold_repetition = (1 if state.is_fivefold_repetition() else 0) \
+                if is_column["is_fivefold_repetition"] else ""
+            is_game_over = (1 if state.is_game_over() else 0) if is_column["is_game_over"] else ""
+            is_insufficient_material = (1 if state.is_insufficient_material() else 0) \
+                if is_column["is_insufficient_material"] else ""
 
         is_white_move = not self.__is_number_even(order_number)
 
@@ -266,7 +606,7 @@ class Process:
         # this calculates engine evaluation but only an engine has been specified
         evaluation = 0
         if engine is not None:
-            evaluation = self.__get_evaluation_from_board(board, depth, engine, is_white_move)
+            evaluation = self.__get_evaluation(pov_score, is_white_move)
 
         data = [game_id,
                 order_number,
@@ -278,36 +618,23 @@ class Process:
                 player_move.get_to_square(),
                 player_move.get_piece().upper(),
                 player_colour,
-                board.board_fen(),
-                1 if board.is_check() else 0,
-                1 if board.is_checkmate() else 0,
-                1 if board.is_fifty_moves() else 0,
-                1 if board.is_fivefold_repetition() else 0,
-                1 if board.is_game_over() else 0,
-                1 if board.is_insufficient_material() else 0,
+                fen_position,
+                is_check,
+                is_checkmate,
+                is_fifty_moves,
+                is_fivefold_repetition,
+                is_game_over,
+                is_insufficient_material,
                 white_count,
                 black_count,
-                fen_stats.get_piece_count(chess.PAWN, chess.WHITE),
-                fen_stats.get_piece_count(chess.PAWN, chess.BLACK),
-                fen_stats.get_piece_count(chess.QUEEN, chess.WHITE),
-                fen_stats.get_piece_count(chess.QUEEN, chess.BLACK),
-                fen_stats.get_piece_count(chess.BISHOP, chess.WHITE),
-                fen_stats.get_piece_count(chess.BISHOP, chess.BLACK),
-                fen_stats.get_piece_count(chess.KNIGHT, chess.WHITE),
-                fen_stats.get_piece_count(chess.KNIGHT, chess.BLACK),
-                fen_stats.get_piece_count(chess.ROOK, chess.WHITE),
-                fen_stats.get_piece_count(chess.ROOK, chess.BLACK),
-                fen_stats.get_captured_score(chess.WHITE),
-                fen_stats.get_captured_score(chess.BLACK),
-                fen_row_valuations[0][0], fen_row_valuations[1][0], fen_row_valuations[2][0], fen_row_valuations[3][0],
-                fen_row_valuations[4][0], fen_row_valuations[5][0], fen_row_valuations[6][0], fen_row_valuations[7][0],
-                fen_row_valuations[0][1], fen_row_valuations[1][1], fen_row_valuations[2][1], fen_row_valuations[3][1],
-                fen_row_valuations[4][1], fen_row_valuations[5][1], fen_row_valuations[6][1], fen_row_valuations[7][1],
-                fen_row_valuations[0][2], fen_row_valuations[1][2], fen_row_valuations[2][2], fen_row_valuations[3][2],
-                fen_row_valuations[4][2], fen_row_valuations[5][2], fen_row_valuations[6][2], fen_row_valuations[7][2],
-                fen_row_valuations[0][3], fen_row_valuations[1][3], fen_row_valuations[2][3], fen_row_valuations[3][3],
-                fen_row_valuations[4][3], fen_row_valuations[5][3], fen_row_valuations[6][3], fen_row_valuations[7][3],
-                sequence]
+                *piece_counts,
+                *fen_row_values]
+
+        if self.move_sequence != MOVE_SEQUENCE_NONE:
+            data.append(sequence)
+
+        if self.__move_column_indexes is not None:
+            data = [data[index] for index in self.__move_column_indexes]
 
         if engine is not None:
             if isinstance(evaluation, int) and isinstance(white_eval, int) and isinstance(black_eval, int):
@@ -319,29 +646,75 @@ class Process:
 
         return data, evaluation, is_white_move
 
+    def __get_position_id(self, board):
+        """
+        returns the id of the position on the board, the position is written into the positions file
+        the first time it is seen, so its fen stats are only calculated once
+        """
+        fen_position = board.board_fen()
+        position_id = get_position_key(fen_position)
+        if position_id not in self.position_ids:
+            self.position_ids.add(position_id)
+            fen_stats = FenStats(fen_position, board, self.fen_row_cache)
+            white_count, black_count = fen_stats.get_total_piece_count()
+            piece_counts = [fen_stats.get_piece_count(piece, color) for piece in counted_pieces
+                            for color in [chess.WHITE, chess.BLACK]]
+            fen_row_valuations = fen_stats.get_fen_row_counts_and_valuation()
+            self.__positions_writer.writerow([position_id, fen_position, white_count, black_count, *piece_counts,
+                                              fen_stats.get_captured_score(chess.WHITE),
+                                              fen_stats.get_captured_score(chess.BLACK),
+                                              *[fen_row_valuations[row][index] for index in range(4)
+                                                for row in range(8)]])
+            self.position_count += 1
+        return position_id
+
     @staticmethod
-    def __get_evaluation_from_board(board, depth, engine, is_white_move):
-        # this wrapped in a function because engline.analyse is not able to
-        # parse the board object without errors
-        evaluation = 0
-        try:
-            info = engine.analyse(board, chess.engine.Limit(depth=depth))
-            pov_score = info["score"]
-            evaluation = pov_score.white().score() if is_white_move else pov_score.black().score()
-        except Exception as ex:
-            log.error(ex)
-        return evaluation
+    def __get_evaluation(pov_score, is_white_move):
+        # the engine pool returns None when the engine was not able to analyse the position
+        if pov_score is None:
+            return 0
+        return pov_score.white().score() if is_white_move else pov_score.black().score()
 
     @staticmethod
     def __is_number_even(number):
         return number % 2 == 0
 
     @staticmethod
-    def __get_winner(game):
-        info = game.headers
-        if "White" in info and "Black" in info and "Result" in info:
-            if game.headers["Result"] == "1/2-1/2":
+    def __get_winner(headers):
+        if "White" in headers and "Black" in headers and "Result" in headers:
+            if headers["Result"] == "1/2-1/2":
                 return "draw"
-            return game.headers["White"] if game.headers["Result"] == "1-0" else game.headers["Black"]
+            return headers["White"] if headers["Result"] == "1-0" else headers["Black"]
         else:
             return ""
+
+
+def get_game_key(file_name, position, occurrence=0):
+    """
+    returns a 63 bit integer from the hash of the path of the pgn file and a position in the file
+    occurrence is only added for the repeats of a file, so the ids of a file listed once do not change
+    """
+    if occurrence > 0:
+        return get_hash_key("{}:{}:{}".format(file_name, position, occurrence))
+    return get_hash_key("{}:{}".format(file_name, position))
+
+
+def get_file_occurrences(file_list):
+    """
+    returns the number of times each pgn file of the list is in the list before it
+    """
+    counts = Counter()
+    occurrences = []
+    for pgn_file in file_list:
+        path = os.path.abspath(pgn_file)
+        occurrences.append(counts[path])
+        counts[path] += 1
+    return occurrences
+
+
+def get_position_key(fen_position):
+    """
+    returns a 63 bit integer from the hash of the position of the pieces,
+    the same position has the same id in every export
+    """
+    return get_hash_key(fen_position)
@@ -0,0 +1,106 @@
+import logging
+import ntpath
+import os.path
+import threading
+from datetime import timedelta
+from timeit import default_timer as timer
+
+log = logging.getLogger("pgn2data - progress")
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_PROGRESS_INTERVAL = 60
+
+
+class Progress:
+    """
+    Progress of the conversion of a pgn file, this is passed to the progress callback
+    offset is the byte position read in the pgn file, start and end are the bytes of the file being converted
+    games_read is the number of games read, and games the number of games with their moves converted
+    backlog is the number of games read that are waiting for their moves to be converted
+    eta is the estimated number of seconds left, it is None until it can be estimated
+    """
+
+    def __init__(self, file_name, offset, start, end, games_read, games, plies, backlog, elapsed):
+        self.file_name = file_name
+        self.offset = offset
+        self.start = start
+        self.end = end
+        self.games_read = games_read
+        self.games = games
+        self.plies = plies
+        self.backlog = backlog
+        self.elapsed = elapsed
+        self.games_per_second = games / elapsed if elapsed > 0 else 0.0
+        self.plies_per_second = plies / elapsed if elapsed > 0 else 0.0
+        self.fraction_done = self.__get_fraction_done()
+        self.eta = elapsed * (1 - self.fraction_done) / self.fraction_done if self.fraction_done > 0 else None
+
+    def __get_fraction_done(self):
+        """
+        the games read are ahead of the games converted, so the bytes read are scaled by the games converted
+        """
+        if self.end <= self.start or self.games_read == 0:
+            return 0.0
+        fraction_read = min(max(self.offset - self.start, 0) / (self.end - self.start), 1.0)
+        return fraction_read * self.games / self.games_read
+
+    def __str__(self):
+        return "{}: {:.1%} | offset: {} of {} bytes | games: {} | plies: {} | {:.1f} games/s | {:.0f} plies/s | " \
+               "backlog: {} | eta: {}".format(ntpath.basename(self.file_name), self.fraction_done, self.offset,
+                                             self.end, self.games, self.plies, self.games_per_second,
+                                             self.plies_per_second, self.backlog,
+                                             timedelta(seconds=int(self.eta)) if self.eta is not None else "-")
+
+
+class ProgressReporter:
+    """
+    Reports the progress of the conversion of a pgn file every interval seconds, from its own thread
+    so the progress is still reported when the conversion is stalled, for example waiting on the engine
+    The counters are set by the conversion as it goes, the callback is called with a Progress object,
+    or the progress is logged if there is no callback. An interval of 0 turns off the reports.
+    """
+
+    def __init__(self, file_name, start=0, end=None, interval=DEFAULT_PROGRESS_INTERVAL, callback=None):
+        self.file_name = file_name
+        self.start = start
+        self.end = os.path.getsize(file_name) if end is None else end
+        self.interval = interval
+        self.callback = callback
+        self.offset = start
+        self.games_read = 0
+        self.games = 0
+        self.plies = 0
+        self.get_backlog = None
+        self.__start_time = timer()
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+    def start_reports(self):
+        self.__start_time = timer()
+        if self.interval > 0:
+            self.__thread = threading.Thread(target=self.__report_every_interval, name="progress reports", daemon=True)
+            self.__thread.start()
+
+    def stop_reports(self):
+        self.__stopped.set()
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def get_progress(self):
+        backlog = self.get_backlog() if self.get_backlog is not None else 0
+        return Progress(self.file_name, self.offset, self.start, self.end, self.games_read, self.games, self.plies,
+                        backlog, timer() - self.__start_time)
+
+    def report(self):
+        progress = self.get_progress()
+        if self.callback is not None:
+            try:
+                self.callback(progress)
+            except Exception as ex:
+                log.error("progress callback failed: {}".format(ex))
+        else:
+            log.info(str(progress))
+
+    def __report_every_interval(self):
+        while not self.__stopped.wait(self.interval):
+            self.report()
@@ -2,20 +2,47 @@ import logging
 import pandas as pd
 import os
 
+from converter.game_index import GameIndex
+from converter.headers import column_types, file_headers_game
+
 log = logging.getLogger("pgn2data - process")
 logging.basicConfig(level=logging.INFO)
 
+DEFAULT_CHUNK_SIZE = 100000
+
 
 class Result:
     """
     results of the extract are tracked here
-    games_file and moves_file are ResultFile objects
+    games_file and moves_file are ResultFile objects, positions_file is a ResultFile when the export created
+    a positions file, otherwise it is None. index_file is the same for the index of the games
+    statistics are the counters of the conversion added together for all the files
+    stage_timings has the time taken by each stage of the conversion, when export is called with timings=True
+    game_count is the number of games read, filtered_count is the number of them skipped by the game filter
+    position_count is the number of positions in the positions file
     """
 
-    def __init__(self, is_complete, games_file, moves_file):
+    def __init__(self, is_complete, games_file, moves_file, statistics=None, positions_file=None, index_file=None):
         self.is_complete = is_complete
         self.games_file = games_file
         self.moves_file = moves_file
+        self.positions_file = positions_file
+        self.index_file = index_file
+        self.statistics = statistics if statistics is not None else {}
+        self.game_count = self.statistics.get("game_count", 0)
+        self.filtered_count = self.statistics.get("filtered_count", 0)
+        self.position_count = self.statistics.get("position_count", 0)
+        self.eval_cache_hits = self.statistics.get("eval_cache_hits", 0)
+        self.eval_cache_misses = self.statistics.get("eval_cache_misses", 0)
+        self.fen_row_cache_hits = self.statistics.get("fen_row_cache_hits", 0)
+        self.fen_row_cache_misses = self.statistics.get("fen_row_cache_misses", 0)
+        self.fen_row_cache_size = self.statistics.get("fen_row_cache_size", 0)
+        self.stage_timings = self.statistics.get("stage_timings", {})
+
+    @property
+    def fen_row_cache_hit_rate(self):
+        total = self.fen_row_cache_hits + self.fen_row_cache_misses
+        return self.fen_row_cache_hits / total if total > 0 else 0.0
 
     @staticmethod
     def get_empty_result():
@@ -29,19 +56,80 @@ class Result:
         print("games file: {} | size: {}".format(self.games_file.name, self.games_file.size))
         if self.moves_file is not None:
             print("moves file: {} | size: {}".format(self.moves_file.name, self.moves_file.size))
+        if self.positions_file is not None:
+            print("positions file: {} | size: {} | positions: {}".format(self.positions_file.name,
+                                                                        self.positions_file.size,
+                                                                        self.position_count))
+        if self.index_file is not None:
+            print("index file: {} | size: {}".format(self.index_file.name, self.index_file.size))
+        if self.filtered_count > 0:
+            print("games read: {} | skipped by the filter: {}".format(self.game_count, self.filtered_count))
+        if self.eval_cache_hits + self.eval_cache_misses > 0:
+            print("engine cache hits: {} | misses: {}".format(self.eval_cache_hits, self.eval_cache_misses))
+        if self.fen_row_cache_hits + self.fen_row_cache_misses > 0:
+            print("fen row cache hit rate: {:.2%} | size: {}".format(self.fen_row_cache_hit_rate,
+                                                                     self.fen_row_cache_size))
 
-    def get_games_df(self):
-        return self.__get_as_dataframe(self.games_file.name)
+    def get_games_df(self, columns=None):
+        """
+        columns is a list of the columns to load, all the columns are loaded if it is not given
+        """
+        return self.__get_as_dataframe(self.games_file.name, columns)
 
-    def get_moves_df(self):
+    def get_moves_df(self, columns=None):
+        """
+        columns is a list of the columns to load, all the columns are loaded if it is not given
+        """
         if self.moves_file is None:
             return None
         else:
-            return self.__get_as_dataframe(self.moves_file.name)
+            return self.__get_as_dataframe(self.moves_file.name, columns)
+
+    def get_positions_df(self, columns=None):
+        """
+        columns is a list of the columns to load, all the columns are loaded if it is not given
+        the moves are joined with their positions on the position_id column
+        """
+        if self.positions_file is None:
+            return None
+        else:
+            return self.__get_as_dataframe(self.positions_file.name, columns)
+
+    def get_games_by_moves(self, moves):
+        """
+        returns the ids of the games that start with the moves, in game order, using the index of the export
+        moves is a list of moves in SAN or UCI notation, e.g. ["e4", "c5"], or a move sequence like "e4|c5"
+        raises ValueError if a move is not valid or there are more moves than the depth of the index
+        """
+        game_index = self.__get_game_index()
+        if game_index is None:
+            return None
+        try:
+            return game_index.get_games_by_moves(moves)
+        finally:
+            game_index.close(create_indexes=False)
+
+    def get_games_by_position(self, fen):
+        """
+        returns the ids of the games that have the position of the pieces of the fen
+        after one of their first moves, in game order, using the index of the export
+        """
+        game_index = self.__get_game_index()
+        if game_index is None:
+            return None
+        try:
+            return game_index.get_games_by_position(fen)
+        finally:
+            game_index.close(create_indexes=False)
 
     def get_combined_df(self):
+        """
+        the moves have the columns of their positions, when there is a positions file
+        """
         games_df = self.get_games_df()
         moves_df = self.get_moves_df()
+        if moves_df is not None and self.positions_file is not None:
+            moves_df = pd.merge(moves_df, self.get_positions_df(), on='position_id', how='left')
 
         if (games_df is not None) and (not games_df.empty):
             if (moves_df is not None) and (not moves_df.empty):
@@ -53,22 +141,165 @@ class Result:
             log.error("games information is missing or empty")
         return None
 
-    def create_combined_file(self, filename):
-        combined_df = self.get_combined_df()
-        if combined_df is not None:
-            combined_df.to_csv(filename, index=False)
+    def iter_combined_df(self, chunksize=DEFAULT_CHUNK_SIZE):
+        """
+        yields the games joined with their moves, in dataframes of up to chunksize moves
+        both files are written in game order, so they are read together in a single pass
+        and only the games of the current chunk of moves are kept in memory
+        the moves have the columns of their positions when there is a positions file, which is loaded
+        into memory as it has one row for each position instead of one for each move
+        """
+        yield from self.__iter_combined_df(chunksize)
+
+    def __iter_combined_df(self, chunksize, is_raw=False):
+        """
+        is_raw reads the values as they are written in the csv files, see __iter_dataframes
+        """
+        games_chunks = self.__iter_dataframes(self.games_file.name, chunksize, is_raw)
+        if self.moves_file is None:
+            yield from games_chunks
+            return
+
+        positions_df = None
+        if self.positions_file is not None:
+            positions_chunks = list(self.__iter_dataframes(self.positions_file.name, chunksize, is_raw))
+            if len(positions_chunks) > 0:
+                positions_df = pd.concat(positions_chunks, ignore_index=True)
+
+        games_df = None
+        has_moves = False
+        for moves_df in self.__iter_dataframes(self.moves_file.name, chunksize, is_raw):
+            has_moves = True
+            if positions_df is not None:
+                moves_df = pd.merge(moves_df, positions_df, on='position_id', how='left')
+            last_game_id = moves_df["game_id"].iloc[-1]
+            while games_df is None or not (games_df["game_id"] == last_game_id).any():
+                next_games_df = next(games_chunks, None)
+                if next_games_df is None:
+                    break  # end of the games file
+                games_df = next_games_df if games_df is None else pd.concat([games_df, next_games_df],
+                                                                            ignore_index=True)
+            if games_df is None:
+                log.error("games information is missing or empty")
+                return
+            yield pd.merge(games_df, moves_df, on='game_id')
+
+            # the last game can continue in the next chunk of moves, the games before it are complete
+            last_game_index = games_df.index[games_df["game_id"] == last_game_id]
+            if len(last_game_index) > 0:
+                games_df = games_df.loc[last_game_index[0]:].reset_index(drop=True)
+
+        if not has_moves:
+            yield from games_chunks
+
+    def create_combined_file(self, filename, chunksize=DEFAULT_CHUNK_SIZE):
+        """
+        writes the games joined with their moves into a csv file, one chunk at a time
+        the values are written as they are in the games and moves files, so the is_ columns are 0 or 1
+        """
+        is_written = False
+        with open(filename, mode='w', newline='', encoding="utf-8") as file:
+            for combined_df in self.__iter_combined_df(chunksize, is_raw=True):
+                combined_df.to_csv(file, index=False, header=not is_written)
+                is_written = True
+        if is_written:
             return os.path.exists(filename)
         else:
+            os.remove(filename)
             log.error("could not combine games and moves file")
             return False
 
-    def __get_as_dataframe(self, file):
+    def __iter_dataframes(self, file, chunksize, is_raw=False):
+        """
+        yields the rows of the file in dataframes of up to chunksize rows, empty dataframes are skipped
+        is_raw keeps the values of csv files as text, without the types of the columns,
+        and the bool columns of parquet files are 0 or 1 as they are in csv files
+        """
+        if not self.is_complete:
+            self.__display_not_found(file)
+            return
+        if file.endswith(".parquet"):
+            import pyarrow.parquet
+            parquet_file = pyarrow.parquet.ParquetFile(file)
+            for batch in parquet_file.iter_batches(batch_size=chunksize):
+                if batch.num_rows > 0:
+                    df = batch.to_pandas()
+                    if is_raw:
+                        for column in df.columns:
+                            if pd.api.types.is_bool_dtype(df[column]):
+                                df[column] = df[column].astype("int8")
+                    yield df
+            parquet_file.close()
+        elif is_raw:
+            with pd.read_csv(file, chunksize=chunksize, dtype=str, keep_default_na=False) as reader:
+                for df in reader:
+                    if not df.empty:
+                        yield df
+        else:
+            dtypes, numeric_columns = self.__get_csv_types(pd.read_csv(file, nrows=0).columns)
+            with pd.read_csv(file, chunksize=chunksize, dtype=dtypes) as reader:
+                for df in reader:
+                    if not df.empty:
+                        yield self.__to_numeric(df, numeric_columns)
+
+    def __get_as_dataframe(self, file, columns=None):
         if self.is_complete:
-            return pd.read_csv(file)
+            if file.endswith(".parquet"):
+                # the types of the columns are stored in the parquet file
+                return pd.read_parquet(file, columns=columns)
+            headers = list(pd.read_csv(file, nrows=0).columns)
+            if columns is not None:
+                missing_columns = [column for column in columns if column not in headers]
+                if len(missing_columns) > 0:
+                    log.error("Columns not found in {}: {}".format(file, ", ".join(missing_columns)))
+                    return None
+                headers = [header for header in headers if header in columns]
+            dtypes, numeric_columns = self.__get_csv_types(headers)
+            return self.__to_numeric(pd.read_csv(file, usecols=headers, dtype=dtypes), numeric_columns)
         else:
             self.__display_not_found(file)
             return None
 
+    def __get_game_index(self):
+        if self.index_file is None:
+            log.error("The export has no index of the games, export with index=True to create it")
+            return None
+        if not self.is_complete or not os.path.isfile(self.index_file.name):
+            self.__display_not_found(self.index_file.name)
+            return None
+        return GameIndex(self.index_file.name)
+
+    @staticmethod
+    def __get_csv_types(headers):
+        """
+        returns the pandas types of the columns, taken from column_types, and the columns that are converted
+        to numbers after loading. These are the values of the game headers, which come from the pgn file and
+        are not always numbers (e.g. "?"), values that are not numbers are loaded as missing.
+        nullable types are used, as columns can have missing values.
+        """
+        dtypes = {}
+        numeric_columns = {}
+        for header in headers:
+            column_type = column_types.get(header)
+            if column_type is None:
+                continue
+            if column_type == "bool":
+                column_type = "boolean"
+            elif column_type.startswith("int"):
+                column_type = column_type.capitalize()
+            if header in file_headers_game and column_type.startswith(("Int", "float")) and header != "game_order":
+                numeric_columns[header] = column_type
+                dtypes[header] = "str"
+            else:
+                dtypes[header] = column_type
+        return dtypes, numeric_columns
+
+    @staticmethod
+    def __to_numeric(df, numeric_columns):
+        for column, column_type in numeric_columns.items():
+            df[column] = pd.to_numeric(df[column], errors="coerce").astype(column_type)
+        return df
+
     @staticmethod
     def __display_not_found(file):
         log.error("File not found: {}".format(file))
@@ -0,0 +1,265 @@
+import csv
+import logging
+import os
+
+from common.common import open_file
+from common.pgn_reader import get_compression
+from converter.headers import column_types
+
+log = logging.getLogger("pgn2data - writer")
+logging.basicConfig(level=logging.INFO)
+
+FORMAT_CSV = "csv"
+FORMAT_PARQUET = "parquet"
+format_options = [FORMAT_CSV, FORMAT_PARQUET]
+
+# compression of csv files, and the extension added to the name of the files
+compression_options = {"gzip": ".gz", "bz2": ".bz2", "xz": ".xz", "zstd": ".zst"}
+
+DEFAULT_ROW_GROUP_SIZE = 100000
+
+
+def get_writer(file):
+    """
+    returns an object with the writerow method of a csv writer,
+    the output files are either text files or writers for other formats
+    """
+    return file if hasattr(file, "writerow") else csv.writer(file, delimiter=',')
+
+
+def get_file_extension(file_format, compression=None):
+    if file_format == FORMAT_PARQUET:
+        return ".parquet"
+    return ".csv" + compression_options[compression] if compression is not None else ".csv"
+
+
+class ParquetWriter:
+    """
+    Writes rows into a parquet file, used in place of a csv writer
+    The first row written is the headers, the type of each column is taken from column_types.
+    Rows are kept in memory until there are enough to write a row group.
+    types are the types of the columns that are different from column_types
+    """
+
+    def __init__(self, name, row_group_size=DEFAULT_ROW_GROUP_SIZE, types=None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("pyarrow needs to be installed to export parquet files: pip install pyarrow")
+        self.__pa = pyarrow
+        self.__pq = pyarrow.parquet
+        self.name = name
+        self.row_group_size = row_group_size
+        self.column_types = dict(column_types, **types) if types is not None else column_types
+        self.closed = False
+        self.__headers = None
+        self.__schema = None
+        self.__writer = None
+        self.__rows = []
+
+    def writerow(self, row):
+        if self.__headers is None:
+            self.__set_headers(row)
+        else:
+            self.__rows.append(row)
+            if len(self.__rows) >= self.row_group_size:
+                self.__write_row_group()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        self.__write_row_group()
+
+    def close(self):
+        if self.closed:
+            return
+        self.__write_row_group()
+        if self.__writer is None and self.__schema is not None:
+            # no rows were written, the file still needs the columns
+            self.__writer = self.__pq.ParquetWriter(self.name, self.__schema)
+        if self.__writer is not None:
+            self.__writer.close()
+        self.closed = True
+
+    def __set_headers(self, headers):
+        self.__headers = list(headers)
+        self.__schema = self.__pa.schema([(header, self.__get_arrow_type(header)) for header in self.__headers])
+
+    def __get_arrow_type(self, header):
+        column_type = self.column_types.get(header, "string")
+        if column_type == "category":
+            return self.__pa.dictionary(self.__pa.int32(), self.__pa.string())
+        return getattr(self.__pa, column_type)() if column_type != "bool" else self.__pa.bool_()
+
+    def __write_row_group(self):
+        if len(self.__rows) == 0:
+            return
+        columns = []
+        for index, header in enumerate(self.__headers):
+            values = [row[index] if index < len(row) else None for row in self.__rows]
+            columns.append(self.__get_column(header, values))
+        table = self.__pa.Table.from_arrays(columns, schema=self.__schema)
+        if self.__writer is None:
+            self.__writer = self.__pq.ParquetWriter(self.name, self.__schema)
+        self.__writer.write_table(table)
+        self.__rows = []
+
+    def __get_column(self, header, values):
+        """
+        converts the values to the type of the column, values that are missing or not valid are null
+        values can be python objects or strings read from a csv file
+        """
+        column_type = self.column_types.get(header, "string")
+        if column_type == "bool":
+            values = [None if value in (None, "") else str(value) in ("1", "True") for value in values]
+        elif column_type.startswith("int"):
+            values = [to_int(value) for value in values]
+        elif column_type.startswith("float"):
+            values = [to_float(value) for value in values]
+        else:
+            # empty strings are null, the same as when a csv file is loaded into pandas
+            values = [None if value in (None, "") else str(value) for value in values]
+        if column_type == "category":
+            return self.__pa.array(values, type=self.__pa.string()).dictionary_encode()
+        return self.__pa.array(values, type=self.__schema.field(header).type)
+
+
+class ColumnTracker:
+    """
+    Passes rows on to the writer of a file, and keeps track of the columns that only had empty values
+    The first row written is the headers.
+    state is the result of get_state, used to continue tracking a file that already has rows
+    """
+
+    def __init__(self, file, state=None):
+        self.file = file
+        self.name = file.name
+        self.headers = None
+        self.row_count = 0
+        self.__writer = get_writer(file)
+        self.__empty_indexes = []
+        if state is not None and state["headers"] is not None:
+            self.headers = state["headers"]
+            self.row_count = state["row_count"]
+            self.__empty_indexes = [self.headers.index(column) for column in state["empty_columns"]]
+
+    def writerow(self, row):
+        if self.headers is None:
+            self.headers = list(row)
+            self.__empty_indexes = list(range(len(self.headers)))
+        else:
+            # only the columns that have been empty so far are checked
+            if len(self.__empty_indexes) > 0:
+                self.__empty_indexes = [index for index in self.__empty_indexes
+                                        if index >= len(row) or row[index] is None or row[index] == ""]
+            self.row_count += 1
+        self.__writer.writerow(row)
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def get_empty_columns(self):
+        if self.headers is None or self.row_count == 0:
+            return []
+        return [self.headers[index] for index in self.__empty_indexes]
+
+    def get_state(self):
+        return {"headers": self.headers,
+                "row_count": self.row_count,
+                "empty_columns": [self.headers[index] for index in self.__empty_indexes] if self.headers else []}
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def remove_csv_columns(file_name, columns):
+    """
+    rewrites the csv file without the columns, one row at a time
+    """
+    temp_file_name = file_name + ".tmp"
+    compression = get_compression(file_name)
+    with open_file(file_name, mode='r', compression=compression) as file_input, \
+            open_file(temp_file_name, compression=compression) as file_output:
+        reader = csv.reader(file_input)
+        writer = csv.writer(file_output, delimiter=',')
+        headers = next(reader, [])
+        indexes = [index for index, header in enumerate(headers) if header not in columns]
+        writer.writerow([headers[index] for index in indexes])
+        for row in reader:
+            writer.writerow([row[index] for index in indexes if index < len(row)])
+    os.replace(temp_file_name, file_name)
+
+
+def remove_game_rows(games_file_name, moves_file_name, pgn_file_name):
+    """
+    rewrites the csv files without the games converted from the pgn file, and their moves, one row at a time
+    returns the number of games removed
+    """
+    game_ids = set()
+    temp_file_name = games_file_name + ".tmp"
+    with open(games_file_name, mode='r', newline='', encoding="utf-8") as file_input, \
+            open(temp_file_name, mode='w', newline='', encoding="utf-8") as file_output:
+        reader = csv.reader(file_input)
+        writer = csv.writer(file_output, delimiter=',')
+        headers = next(reader, [])
+        writer.writerow(headers)
+        game_id_index = headers.index("game_id")
+        file_name_index = headers.index("file_name")
+        for row in reader:
+            if row[file_name_index] == pgn_file_name:
+                game_ids.add(row[game_id_index])
+            else:
+                writer.writerow(row)
+    os.replace(temp_file_name, games_file_name)
+
+    if moves_file_name is not None and len(game_ids) > 0:
+        temp_file_name = moves_file_name + ".tmp"
+        with open(moves_file_name, mode='r', newline='', encoding="utf-8") as file_input, \
+                open(temp_file_name, mode='w', newline='', encoding="utf-8") as file_output:
+            reader = csv.reader(file_input)
+            writer = csv.writer(file_output, delimiter=',')
+            headers = next(reader, [])
+            writer.writerow(headers)
+            game_id_index = headers.index("game_id")
+            writer.writerows(row for row in reader if row[game_id_index] not in game_ids)
+        os.replace(temp_file_name, moves_file_name)
+    return len(game_ids)
+
+
+def remove_parquet_columns(file_name, columns):
+    """
+    rewrites the parquet file without the columns, one row group at a time
+    """
+    import pyarrow.parquet
+
+    temp_file_name = file_name + ".tmp"
+    parquet_file = pyarrow.parquet.ParquetFile(file_name)
+    schema = parquet_file.schema_arrow
+    kept_columns = [name for name in schema.names if name not in columns]
+    kept_schema = pyarrow.schema([schema.field(name) for name in kept_columns])
+    with pyarrow.parquet.ParquetWriter(temp_file_name, kept_schema) as writer:
+        for index in range(parquet_file.num_row_groups):
+            writer.write_table(parquet_file.read_row_group(index, columns=kept_columns))
+    parquet_file.close()
+    os.replace(temp_file_name, file_name)
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
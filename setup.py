@@ -28,6 +28,10 @@ setup(
         'chess',
         'pandas'
     ],
+    extras_require={
+        'parquet': ['pyarrow'],
+        'zstd': ['zstandard']
+    },
     long_description=open('README.md').read(),
     long_description_content_type='text/markdown; charset=UTF-8; variant=GFM',
     description='Converts a chess pgn file into a csv dataset containing game information and move information',
@@ -0,0 +1,314 @@
+"""
+==========================================================
+    Benchmarks for the pgn2data library
+
+    Synthetic pgn files are generated from a fixed seed, so
+    the same corpus is created on every machine. Each corpus
+    is converted in one or more modes:
+
+        games   games file only (moves_required=False)
+        moves   games and moves files
+        engine  games and moves files, evaluated with the
+                engine stub (testing/engine_stub.py)
+
+    Each conversion runs in its own process, the games/s,
+    plies/s, peak memory and size of the output files are
+    saved to a JSON report. A report can be compared to a
+    saved baseline so performance regressions show up.
+
+    Usage:
+    >> python -m testing.benchmark --games 10000 100000 --clocks
+    >> python -m testing.benchmark --games 10000 --baseline baseline.json
+==========================================================
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from timeit import default_timer as timer
+
+import chess
+
+from converter.pgn_data import PGNData
+
+log = logging.getLogger("pgn2data - benchmark")
+logging.basicConfig(level=logging.INFO)
+
+MODE_GAMES = "games"
+MODE_MOVES = "moves"
+MODE_ENGINE = "engine"
+mode_options = [MODE_GAMES, MODE_MOVES, MODE_ENGINE]
+
+DEFAULT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+DEFAULT_TOLERANCE = 0.1
+
+# the games of a corpus are taken from a pool of random games, so large corpora can be written quickly
+GAME_POOL_SIZE = 500
+PLAYER_POOL_SIZE = 1000
+MAX_PLIES = 160
+
+comments = ["a good move", "the only move", "a mistake", "an interesting idea", "book move"]
+terminations = ["Normal", "Time forfeit"]
+time_controls = ["60+0", "180+0", "180+2", "300+0", "600+5"]
+
+
+def get_corpus_name(games, with_comments=False, with_clocks=False, seed=0):
+    name = "synthetic_{}".format(games)
+    name += "_comments" if with_comments else ""
+    name += "_clocks" if with_clocks else ""
+    name += "_seed{}".format(seed) if seed != 0 else ""
+    return name
+
+
+def generate_pgn(file_name, games, with_comments=False, with_clocks=False, seed=0):
+    """
+    writes a pgn file of random games, the same arguments always create the same file
+    returns the number of games and plies written
+    """
+    rng = random.Random(seed)
+    pool = [get_random_game(rng, with_comments, with_clocks) for _ in range(min(games, GAME_POOL_SIZE))]
+    players = ["player{:04d}".format(index) for index in range(PLAYER_POOL_SIZE)]
+    start_date = datetime(2021, 1, 1)
+
+    plies = 0
+    with open(file_name, mode='w', encoding="utf-8", newline="\n") as file:
+        for index in range(games):
+            movetext, result, ply_count = pool[rng.randrange(len(pool))]
+            date = start_date + timedelta(seconds=index * 30)
+            white_elo = rng.randint(800, 3000)
+            black_elo = rng.randint(800, 3000)
+            headers = [("Event", "Synthetic Arena"),
+                       ("Site", "https://example.org/{}".format(index)),
+                       ("Date", date.strftime("%Y.%m.%d")),
+                       ("Round", "-"),
+                       ("White", rng.choice(players)),
+                       ("Black", rng.choice(players)),
+                       ("Result", result),
+                       ("UTCDate", date.strftime("%Y.%m.%d")),
+                       ("UTCTime", date.strftime("%H:%M:%S")),
+                       ("WhiteElo", str(white_elo)),
+                       ("BlackElo", str(black_elo)),
+                       ("WhiteRatingDiff", "{:+d}".format(rng.randint(-10, 10))),
+                       ("BlackRatingDiff", "{:+d}".format(rng.randint(-10, 10))),
+                       ("Variant", "Standard"),
+                       ("TimeControl", rng.choice(time_controls)),
+                       ("ECO", "A{:02d}".format(rng.randint(0, 99))),
+                       ("Termination", rng.choice(terminations))]
+            for tag, value in headers:
+                file.write('[{} "{}"]\n'.format(tag, value))
+            file.write("\n{}\n\n".format(movetext))
+            plies += ply_count
+    return games, plies
+
+
+def get_random_game(rng, with_comments=False, with_clocks=False):
+    """
+    plays random legal moves from the starting position
+    returns the movetext, the result and the number of plies
+    """
+    board = chess.Board()
+    tokens = []
+    clocks = [180, 180]
+    for ply in range(rng.randint(10, MAX_PLIES)):
+        moves = list(board.legal_moves)
+        if len(moves) == 0:
+            break
+        move = rng.choice(moves)
+        if board.turn == chess.WHITE:
+            tokens.append("{}.".format(board.fullmove_number))
+        tokens.append(board.san(move))
+        board.push(move)
+
+        move_comments = []
+        if with_clocks:
+            side = ply % 2
+            clocks[side] = max(clocks[side] - rng.randint(0, 5), 0)
+            move_comments.append("[%clk {}]".format(timedelta(seconds=clocks[side])))
+        if with_comments and rng.random() < 0.2:
+            move_comments.append(rng.choice(comments))
+        if len(move_comments) > 0:
+            tokens.append("{{ {} }}".format(" ".join(move_comments)))
+            # the move number is repeated after a comment on a white move
+            if board.turn == chess.BLACK:
+                tokens.append("{}...".format(board.fullmove_number))
+
+    if board.is_checkmate():
+        result = "0-1" if board.turn == chess.WHITE else "1-0"
+    else:
+        result = rng.choice(["1-0", "0-1", "1/2-1/2"])
+    if len(tokens) > 0 and tokens[-1].endswith("..."):
+        tokens.pop()
+    tokens.append(result)
+    return " ".join(tokens), result, len(board.move_stack)
+
+
+def get_corpus(folder, games, with_comments=False, with_clocks=False, seed=0):
+    """
+    returns the pgn file name and its details, the file is only generated if it does not exist yet
+    """
+    name = get_corpus_name(games, with_comments, with_clocks, seed)
+    file_name = os.path.join(folder, name + ".pgn")
+    details_file_name = os.path.join(folder, name + ".json")
+    if os.path.isfile(file_name) and os.path.isfile(details_file_name):
+        with open(details_file_name, encoding="utf-8") as file:
+            return file_name, json.load(file)
+
+    log.info("Generating {}".format(file_name))
+    start = timer()
+    game_count, ply_count = generate_pgn(file_name, games, with_comments, with_clocks, seed)
+    details = {"name": name, "games": game_count, "plies": ply_count, "comments": with_comments,
+               "clocks": with_clocks, "seed": seed, "size": os.path.getsize(file_name)}
+    with open(details_file_name, mode='w', encoding="utf-8") as file:
+        json.dump(details, file, indent=2)
+    log.info("Generated {} games in {:.1f} sec".format(game_count, timer() - start))
+    return file_name, details
+
+
+def convert(pgn_file, output_name, mode, workers=1):
+    """
+    converts the pgn file, this runs in its own process so the peak memory is only for this conversion
+    """
+    pgn_data = PGNData(pgn_file, output_name)
+    if mode == MODE_ENGINE:
+        engine_stub = os.path.join(os.path.dirname(os.path.abspath(__file__)), "engine_stub.py")
+        pgn_data.set_engine_path([sys.executable, engine_stub])
+        pgn_data.set_engine_depth(1)
+
+    start = timer()
+    result = pgn_data.export(moves_required=mode != MODE_GAMES, workers=workers)
+    seconds = timer() - start
+
+    output_bytes = result.games_file.size
+    if result.moves_file is not None:
+        output_bytes += result.moves_file.size
+    for file_name in [result.games_file.name, result.moves_file.name if result.moves_file is not None else None]:
+        if file_name is not None and os.path.isfile(file_name):
+            os.remove(file_name)
+    return {"is_complete": result.is_complete, "seconds": seconds, "game_count": result.game_count,
+            "peak_rss_mb": get_peak_rss_mb(), "output_bytes": output_bytes}
+
+
+def get_peak_rss_mb():
+    """
+    peak memory of this process or of the largest process it started (workers and engines)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None  # not available on windows
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # linux reports kilobytes, mac os reports bytes
+    return round(peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024, 1)
+
+
+def run_benchmarks(game_counts, modes=None, with_comments=False, with_clocks=False, seed=0, workers=1,
+                   folder=DEFAULT_FOLDER):
+    """
+    converts a corpus of each size in each mode, and returns the report
+    """
+    modes = mode_options if modes is None else modes
+    os.makedirs(folder, exist_ok=True)
+    report = {"date": datetime.utcnow().isoformat(timespec="seconds"),
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "workers": workers,
+              "results": []}
+
+    for games in game_counts:
+        pgn_file, corpus = get_corpus(folder, games, with_comments, with_clocks, seed)
+        for mode in modes:
+            log.info("Benchmark {} in {} mode".format(corpus["name"], mode))
+            output_name = os.path.join(folder, "{}_{}".format(corpus["name"], mode))
+            # each conversion has a new process, so the memory used by one does not affect the next
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                run = executor.submit(convert, pgn_file, output_name, mode, workers).result()
+            if not run["is_complete"]:
+                log.error("Benchmark {} in {} mode did not complete".format(corpus["name"], mode))
+            seconds = run["seconds"]
+            report["results"].append({"corpus": corpus["name"],
+                                      "mode": mode,
+                                      "games": corpus["games"],
+                                      "plies": corpus["plies"],
+                                      "input_bytes": corpus["size"],
+                                      "is_complete": run["is_complete"],
+                                      "seconds": round(seconds, 3),
+                                      "games_per_second": round(corpus["games"] / seconds, 1),
+                                      "plies_per_second": round(corpus["plies"] / seconds, 1),
+                                      "peak_rss_mb": run["peak_rss_mb"],
+                                      "output_bytes": run["output_bytes"]})
+    return report
+
+
+def compare_to_baseline(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    compares each result to the baseline result of the same corpus and mode
+    returns a list of messages for the results that are slower or use more memory than the tolerance allows
+    """
+    baseline_results = {(result["corpus"], result["mode"]): result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        baseline_result = baseline_results.get((result["corpus"], result["mode"]))
+        if baseline_result is None:
+            continue
+        name = "{} ({})".format(result["corpus"], result["mode"])
+        speed_ratio = result["games_per_second"] / baseline_result["games_per_second"]
+        log.info("{}: {:.0f} games/s, {:.2f}x baseline".format(name, result["games_per_second"], speed_ratio))
+        if speed_ratio < 1 - tolerance:
+            regressions.append("{} is slower: {:.0f} games/s, baseline {:.0f} games/s".format(
+                name, result["games_per_second"], baseline_result["games_per_second"]))
+        if result["peak_rss_mb"] is not None and baseline_result["peak_rss_mb"] is not None:
+            if result["peak_rss_mb"] > baseline_result["peak_rss_mb"] * (1 + tolerance):
+                regressions.append("{} uses more memory: {:.0f} MB, baseline {:.0f} MB".format(
+                    name, result["peak_rss_mb"], baseline_result["peak_rss_mb"]))
+        if result["output_bytes"] != baseline_result["output_bytes"]:
+            log.info("{}: output is {} bytes, baseline {} bytes".format(name, result["output_bytes"],
+                                                                       baseline_result["output_bytes"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pgn2data benchmarks on synthetic pgn files")
+    parser.add_argument("--games", type=int, nargs="+", default=[10000], help="number of games of each corpus")
+    parser.add_argument("--modes", nargs="+", choices=mode_options, default=[MODE_GAMES, MODE_MOVES])
+    parser.add_argument("--comments", action="store_true", help="add comments to the moves")
+    parser.add_argument("--clocks", action="store_true", help="add clock times to the moves")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--folder", default=DEFAULT_FOLDER, help="folder of the pgn files and outputs")
+    parser.add_argument("--report", default=None, help="JSON file the report is saved to")
+    parser.add_argument("--baseline", default=None, help="JSON report the results are compared to")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.games, args.modes, args.comments, args.clocks, args.seed, args.workers,
+                            args.folder)
+    report_file = args.report if args.report is not None else os.path.join(args.folder, "report.json")
+    with open(report_file, mode='w', encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    log.info("Report saved to {}".format(report_file))
+
+    for result in report["results"]:
+        print("{:<40} {:<7} {:>10.0f} games/s {:>12.0f} plies/s {:>8} MB {:>14} bytes".format(
+            result["corpus"], result["mode"], result["games_per_second"], result["plies_per_second"],
+            "{:.0f}".format(result["peak_rss_mb"]) if result["peak_rss_mb"] is not None else "-",
+            result["output_bytes"]))
+
+    if args.baseline is not None:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare_to_baseline(report, json.load(file), args.tolerance)
+        for regression in regressions:
+            log.error(regression)
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+==========================================================
+    A minimal UCI engine used for testing the engine options
+    without having Stockfish installed.
+
+    The evaluation is the material balance from the side to
+    move point of view, so the output is always the same for
+    the same position.
+
+    Usage: PGNData.set_engine_path([sys.executable, path to this file])
+==========================================================
+"""
+
+import sys
+
+import chess
+
+piece_values = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9}
+
+
+def get_material_score(board):
+    score = 0
+    for piece_type, value in piece_values.items():
+        score += len(board.pieces(piece_type, chess.WHITE)) * value * 100
+        score -= len(board.pieces(piece_type, chess.BLACK)) * value * 100
+    score = score if board.turn == chess.WHITE else -score
+    # mobility is added so the evaluation changes between most moves
+    return score + board.legal_moves.count()
+
+
+def get_board(tokens):
+    """
+    tokens are from a position command: position [startpos | fen <fen>] [moves <move> ...]
+    """
+    moves_index = tokens.index("moves") if "moves" in tokens else len(tokens)
+    board = chess.Board() if tokens[1] == "startpos" else chess.Board(" ".join(tokens[2:moves_index]))
+    for move in tokens[moves_index + 1:]:
+        board.push_uci(move)
+    return board
+
+
+def main():
+    board = chess.Board()
+    for line in sys.stdin:
+        tokens = line.split()
+        if not tokens:
+            continue
+        command = tokens[0]
+        if command == "uci":
+            print("id name pgn2data stub")
+            print("uciok")
+        elif command == "isready":
+            print("readyok")
+        elif command == "position":
+            board = get_board(tokens)
+        elif command == "go":
+            depth = tokens[tokens.index("depth") + 1] if "depth" in tokens else 1
+            moves = list(board.legal_moves)
+            print("info depth {} score cp {}".format(depth, get_material_score(board)))
+            print("bestmove {}".format(moves[0].uci() if moves else "(none)"))
+        elif command == "quit":
+            break
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
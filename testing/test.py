@@ -18,20 +18,40 @@
 ==========================================================
 """
 
+import bz2
 import glob
+import gzip
+import io
+import json
 import logging
+import lzma
+import multiprocessing
 import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
 import unittest
 
 import chess
+import chess.pgn
 import pandas as pd
 import itertools
 
+from common.cache import LRUCache
 from common.common import full_range
 from converter.board_ref import BoardPieces
 from converter.fen import FenStats
+from converter.game_filter import GameFilter, get_speed
+from converter.game_index import DEFAULT_INDEX_DEPTH
+from converter.game_state import GameState
+from converter.headers import file_headers_stockfish
 from converter.pgn_data import PGNData
+from converter.process import Process
 from common.log_time import TimeProcess
+from common.pgn_reader import get_game_ranges, open_pgn
+from testing.benchmark import generate_pgn, compare_to_baseline
 
 log = logging.getLogger("pgn2data")
 logging.basicConfig(level=logging.INFO)
@@ -107,6 +127,99 @@ class FenTestCase(unittest.TestCase):
             result = fs.get_piece_count_and_value_for_fen_row(r)
             self.assertEqual(result, valuations[r - 1])
 
+    def run_board_test(self):
+        log_message_title("Fen stats from board test")
+        folder = os.path.dirname(os.path.realpath(__file__))
+        with open(os.path.join(folder, "pgn", "pgn_test2.pgn")) as pgn:
+            game = chess.pgn.read_game(pgn)
+            while game is not None:
+                board = game.board()
+                for move in game.mainline_moves():
+                    board.push(move)
+                    fs_fen = FenStats(board.board_fen())
+                    fs_board = FenStats.from_board(board)
+                    self.assertEqual(fs_fen.get_total_piece_count(), fs_board.get_total_piece_count())
+                    for color in [chess.WHITE, chess.BLACK]:
+                        self.assertEqual(fs_fen.get_captured_score(color), fs_board.get_captured_score(color))
+                        for piece in [chess.PAWN, chess.QUEEN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.KING]:
+                            self.assertEqual(fs_fen.get_piece_count(piece, color),
+                                             fs_board.get_piece_count(piece, color))
+                    self.assertEqual(fs_fen.get_fen_row_counts_and_valuation(),
+                                     fs_board.get_fen_row_counts_and_valuation())
+                game = chess.pgn.read_game(pgn)
+
+    def run_row_cache_test(self):
+        log_message_title("Fen row cache test")
+        cache = LRUCache(3)
+        fens = ["rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR", "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR",
+                "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R"]
+        for fen in fens:
+            self.assertEqual(FenStats(fen, row_cache=cache).get_fen_row_counts_and_valuation(),
+                             FenStats(fen).get_fen_row_counts_and_valuation())
+            self.assertTrue(cache.size <= 3)
+        self.assertTrue(cache.hits > 0)
+        self.assertTrue(0 < cache.hit_rate < 1)
+
+        log.info("check the least recently used entry is removed")
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.size, 2)
+
+
+class GameStateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+    def run_test(self):
+        log_message_title("Game state test")
+        folder = os.path.dirname(os.path.realpath(__file__))
+        for file in ["pgn_test1.pgn", "pgn_test2.pgn", "basic_format_test.pgn"]:
+            with open(os.path.join(folder, "pgn", file)) as pgn:
+                game = chess.pgn.read_game(pgn)
+                while game is not None:
+                    self.__check_moves(game.board(), list(game.mainline_moves()))
+                    game = chess.pgn.read_game(pgn)
+
+        log.info("check repetitions, which are not counted before an irreversible move")
+        shuffle = [chess.Move.from_uci(uci) for uci in ["g1f3", "g8f6", "f3g1", "f6g8"]]
+        self.__check_moves(chess.Board(), shuffle * 5 + [chess.Move.from_uci("e2e4")] + shuffle * 5)
+        board = chess.Board("4k3/8/8/8/3p4/8/4P3/4K2R w K - 0 1")
+        moves = ["e2e4", "e8d8", "e1f1", "d8e8", "f1e1", "e8d8", "e1f1", "d8e8", "f1e1", "e8d8", "h1h2", "d8e8",
+                 "h2h1", "e8d8", "h1h2", "d8e8", "h2h1", "e8d8", "h1h2", "d8e8", "h2h1", "e8d8", "h1h2", "d8e8"]
+        self.__check_moves(board, [chess.Move.from_uci(uci) for uci in moves])
+
+        log.info("check the fifty and seventy five moves rules, stalemate and insufficient material")
+        board = chess.Board("7k/8/8/8/8/8/R7/K7 w - - 96 1")
+        moves = ["a2b2", "h8g8", "b2a2", "g8h8"] * 14
+        self.__check_moves(board, [chess.Move.from_uci(uci) for uci in moves])
+        board = chess.Board("7k/8/8/8/8/8/R7/K7 w - - 146 1")
+        self.__check_moves(board, [chess.Move.from_uci(uci) for uci in moves])
+        self.__check_moves(chess.Board("7k/8/6Q1/8/8/8/8/K7 w - - 0 1"), [chess.Move.from_uci("g6f7")])
+        self.__check_moves(chess.Board("7k/8/8/8/8/8/8/KB6 w - - 0 1"), [chess.Move.from_uci("b1c2")])
+
+    def __check_moves(self, board, moves):
+        state = GameState(board.copy())
+        for move in moves:
+            board.push(move)
+            state.push(move)
+            self.assertEqual(state.is_check(), board.is_check())
+            self.assertEqual(state.is_checkmate(), board.is_checkmate())
+            self.assertEqual(state.is_stalemate(), board.is_stalemate())
+            self.assertEqual(state.is_fifty_moves(), board.is_fifty_moves())
+            self.assertEqual(state.is_seventyfive_moves(), board.is_seventyfive_moves())
+            self.assertEqual(state.is_repetition(3), board.is_repetition(3))
+            self.assertEqual(state.is_fivefold_repetition(), board.is_fivefold_repetition())
+            self.assertEqual(state.is_insufficient_material(), board.is_insufficient_material())
+            self.assertEqual(state.is_game_over(), board.is_game_over())
+            if board.is_game_over():
+                break
+
 
 class FileCreationTestCase(unittest.TestCase):
     exports_folder_name = "exports"
@@ -152,6 +265,24 @@ class FileCreationTestCase(unittest.TestCase):
         self.run_games_queues_parameter_test()
         self.run_single_file_test()
         self.run_multiple_files_test()
+        self.run_parallel_workers_test()
+        self.run_engine_pool_test()
+        self.run_engine_cache_test()
+        self.run_fen_row_cache_test()
+        self.run_move_sequence_test()
+        self.run_parquet_test()
+        self.run_benchmark_corpus_test()
+        self.run_stage_timings_test()
+        self.run_progress_test()
+        self.run_resume_test()
+        self.run_incremental_test()
+        self.run_compressed_input_test()
+        self.run_compressed_output_test()
+        self.run_game_filter_test()
+        self.run_move_columns_test()
+        self.run_game_id_test()
+        self.run_positions_test()
+        self.run_game_index_test()
         self.run_reported_github_issues_test()
         self.run_pandas_dataframe_test()
         self.run_content_test()
@@ -272,6 +403,14 @@ class FileCreationTestCase(unittest.TestCase):
         result.print_summary()
         self.assertTrue(result.is_complete)
 
+        # only the headers are read when the moves are not required, the games file should be the same
+        o = self.get_output_filepath("games_only_with_moves_test")
+        result_with_moves = PGNData(f, o).export()
+        self.assertTrue(result_with_moves.is_complete)
+        games_df = result.get_games_df().drop(columns=["game_id", "date_created"])
+        games_with_moves_df = result_with_moves.get_games_df().drop(columns=["game_id", "date_created"])
+        self.assertTrue(games_df.equals(games_with_moves_df))
+
     def run_games_queues_parameter_test(self):
 
         log_message_title("Games only and queue size parameter test")
@@ -303,6 +442,700 @@ class FileCreationTestCase(unittest.TestCase):
         result.print_summary()
         self.assertTrue(result.is_complete)
 
+    def run_parallel_workers_test(self):
+
+        log_message_title("Parallel workers test")
+        f1 = self.get_source_filepath("pgn_test1.pgn")
+        f2 = self.get_source_filepath("pgn_test2.pgn")
+        f3 = self.get_source_filepath("basic_format_test.pgn")
+
+        o1 = self.get_output_filepath("parallel_workers_test_1")
+        result1 = PGNData([f3, f1, f2], o1).export()
+        o2 = self.get_output_filepath("parallel_workers_test_2")
+        result2 = PGNData([f3, f1, f2], o2).export(workers=2)
+        self.assertTrue(result1.is_complete)
+        self.assertTrue(result2.is_complete)
+
+        log.info("check parallel output matches the sequential output")
+        self.assert_same_output(result1, result2)
+
+        with self.assertRaises(ValueError):
+            PGNData(f1, o2).export(workers=0)
+
+        log_message_title("Parallel split file test")
+        ranges = get_game_ranges(f1, 4)
+        self.assertTrue(len(ranges) == 4)
+        self.assertTrue(ranges[0][0] == 0 and ranges[-1][1] == os.path.getsize(f1))
+        for start, end in ranges:
+            with open_pgn(f1, start, end) as pgn:
+                self.assertTrue(pgn.readline().startswith("[Event "))
+
+        o3 = self.get_output_filepath("parallel_split_test")
+        pgn_data = PGNData([f1, f3], o3)
+        pgn_data.set_split_size(1024)
+        result3 = pgn_data.export(workers=3)
+        self.assertTrue(result3.is_complete)
+        o4 = self.get_output_filepath("parallel_split_test_sequential")
+        result4 = PGNData([f1, f3], o4).export()
+        log.info("check split output matches the sequential output")
+        self.assert_same_output(result3, result4)
+
+    def run_engine_pool_test(self):
+
+        log_message_title("Engine pool test")
+        f = self.get_source_filepath("basic_format_test.pgn")
+        engine_path = [sys.executable, os.path.join(self.folder, "engine_stub.py")]
+
+        o1 = self.get_output_filepath("engine_pool_test_1")
+        pgn_data = PGNData(f, o1)
+        pgn_data.set_engine_path(engine_path)
+        pgn_data.set_engine_depth(1)
+        result1 = pgn_data.export()
+        self.assertTrue(result1.is_complete)
+
+        o2 = self.get_output_filepath("engine_pool_test_3")
+        pgn_data = PGNData(f, o2)
+        pgn_data.set_engine_path(engine_path)
+        pgn_data.set_engine_depth(1)
+        pgn_data.set_engine_count(3)
+        result2 = pgn_data.export()
+        self.assertTrue(result2.is_complete)
+
+        log.info("check the engine pool gives the same evaluations as a single engine")
+        moves_df = result2.get_moves_df()
+        for column in file_headers_stockfish:
+            self.assertTrue(column in moves_df.columns)
+        self.assertFalse(moves_df["eval"].isnull().any())
+        self.assertTrue(len(set(moves_df["eval"].values.tolist())) > 1)
+        self.assert_same_output(result1, result2)
+
+        log.info("check engine columns are not added to exports without an engine")
+        o3 = self.get_output_filepath("engine_pool_test_no_engine")
+        result3 = PGNData(f, o3).export()
+        self.assertFalse("eval" in result3.get_moves_df().columns)
+
+    def run_fen_row_cache_test(self):
+
+        log_message_title("Fen row cache size test")
+        f = self.get_source_filepath("pgn_test2.pgn")
+        results = []
+        for size in [0, 10]:
+            o = self.get_output_filepath(f"fen_row_cache_test_{size}")
+            pgn_data = PGNData(f, o)
+            pgn_data.set_fen_row_cache_size(size)
+            result = pgn_data.export()
+            result.print_summary()
+            self.assertTrue(result.is_complete)
+            results.append(result)
+
+        log.info("check the fen row cache stays within its size")
+        self.assertTrue(results[0].fen_row_cache_size == 0)
+        self.assertTrue(0 < results[1].fen_row_cache_size <= 10)
+        self.assertTrue(results[1].fen_row_cache_hit_rate > 0)
+        self.assert_same_output(results[0], results[1])
+
+    def run_move_sequence_test(self):
+
+        log_message_title("Move sequence test")
+        f = self.get_source_filepath("pgn_test2.pgn")
+        results = {}
+        for move_sequence in ["full", "last", "none"]:
+            o = self.get_output_filepath(f"move_sequence_test_{move_sequence}")
+            result = PGNData(f, o).export(move_sequence=move_sequence)
+            result.print_summary()
+            self.assertTrue(result.is_complete)
+            results[move_sequence] = result
+
+        full_df = results["full"].get_moves_df()
+        last_df = results["last"].get_moves_df()
+        none_df = results["none"].get_moves_df()
+
+        log.info("check the sequence is only on the last move of each game")
+        last_rows = full_df.groupby("game_id").tail(1).index
+        self.assertTrue(last_df.loc[last_rows, "move_sequence"].tolist() == full_df.loc[last_rows,
+                                                                                       "move_sequence"].tolist())
+        self.assertTrue(last_df.drop(index=last_rows)["move_sequence"].isnull().all())
+
+        log.info("check the move sequence column is removed")
+        self.assertFalse("move_sequence" in none_df.columns)
+        pd.testing.assert_frame_equal(full_df.drop(columns=["game_id", "move_sequence"]),
+                                      none_df.drop(columns=["game_id"]))
+        self.assertTrue(results["none"].moves_file.size < results["last"].moves_file.size
+                        < results["full"].moves_file.size)
+
+        with self.assertRaises(ValueError):
+            PGNData(f, self.get_output_filepath("move_sequence_test")).export(move_sequence="invalid")
+
+    def run_parquet_test(self):
+
+        log_message_title("Parquet format test")
+        f1 = self.get_source_filepath("pgn_test1.pgn")
+        f2 = self.get_source_filepath("collapse_test.pgn")
+        csv_result = PGNData([f1, f2], self.get_output_filepath("parquet_test_csv")).export()
+        parquet_result = PGNData([f1, f2], self.get_output_filepath("parquet_test")).export(format="parquet")
+        parquet_result.print_summary()
+        self.assertTrue(parquet_result.is_complete)
+        self.assertTrue(parquet_result.games_file.name.endswith(".parquet"))
+        self.assertTrue(parquet_result.moves_file.size < csv_result.moves_file.size)
+
+        log.info("check the parquet files have the same values as the csv files, with narrow types")
+        csv_moves_df = csv_result.get_moves_df()
+        moves_df = parquet_result.get_moves_df()
+        self.assertTrue(len(moves_df) == len(csv_moves_df))
+        self.assertTrue(moves_df["white_count"].dtype == "int8")
+        self.assertTrue(moves_df["is_check"].dtype == "bool")
+        self.assertTrue(isinstance(moves_df["player"].dtype, pd.CategoricalDtype))
+        for column in ["notation", "fen", "player", "move_sequence"]:
+            self.assertTrue(moves_df[column].astype(str).tolist() == csv_moves_df[column].astype(str).tolist())
+        for column in ["move_no", "white_count", "is_check", "captured_score_for_white", "fen_row8_black_value"]:
+            self.assertTrue(moves_df[column].astype(int).tolist() == csv_moves_df[column].tolist())
+        games_df = parquet_result.get_games_df()
+        csv_games_df = csv_result.get_games_df()
+        self.assertTrue(games_df["game_order"].tolist() == csv_games_df["game_order"].tolist())
+        self.assertTrue(games_df["white"].astype(str).tolist() == csv_games_df["white"].astype(str).tolist())
+
+        log.info("check parquet files from workers and with collapse")
+        workers_result = PGNData([f1, f2], self.get_output_filepath("parquet_test_workers")).export(format="parquet",
+                                                                                                   workers=2)
+        self.assertTrue(workers_result.is_complete)
+        self.assert_same_output(parquet_result, workers_result)
+        collapse_result = PGNData(f2, self.get_output_filepath("parquet_test_collapse")).export(format="parquet",
+                                                                                               collapse=True)
+        for df in [collapse_result.get_games_df(), collapse_result.get_moves_df()]:
+            self.assertTrue(df.columns[df.isnull().all()].empty)
+
+        with self.assertRaises(ValueError):
+            PGNData(f1, self.get_output_filepath("parquet_test")).export(format="xml")
+
+    def run_engine_cache_test(self):
+
+        log_message_title("Engine cache test")
+        f = self.get_source_filepath("basic_format_test.pgn")
+        engine_path = [sys.executable, os.path.join(self.folder, "engine_stub.py")]
+        cache_path = self.get_output_filepath("engine_cache_test.sqlite")
+
+        results = []
+        for run in [1, 2]:
+            o = self.get_output_filepath(f"engine_cache_test_{run}")
+            pgn_data = PGNData(f, o)
+            pgn_data.set_engine_path(engine_path)
+            pgn_data.set_engine_depth(1)
+            pgn_data.set_engine_cache(cache_path)
+            result = pgn_data.export()
+            result.print_summary()
+            self.assertTrue(result.is_complete)
+            results.append(result)
+
+        log.info("check the second export only used the cache")
+        plies = len(results[0].get_moves_df())
+        self.assertTrue(results[0].eval_cache_hits + results[0].eval_cache_misses == plies)
+        self.assertTrue(results[0].eval_cache_misses > 0)
+        self.assertTrue(results[1].eval_cache_hits == plies)
+        self.assertTrue(results[1].eval_cache_misses == 0)
+        self.assert_same_output(results[0], results[1])
+
+        log.info("check the cache size is limited")
+        cache_path = self.get_output_filepath("engine_cache_size_test.sqlite")
+        pgn_data = PGNData(f, self.get_output_filepath("engine_cache_size_test"))
+        pgn_data.set_engine_path(engine_path)
+        pgn_data.set_engine_depth(1)
+        pgn_data.set_engine_cache(cache_path, 10)
+        result = pgn_data.export()
+        self.assertTrue(result.is_complete)
+        with sqlite3.connect(cache_path) as connection:
+            cache_size = connection.execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+        self.assertTrue(0 < cache_size <= 10)
+
+    def run_stage_timings_test(self):
+
+        log_message_title("Stage timings test")
+        f = self.get_source_filepath("pgn_test2.pgn")
+        result = PGNData(f, self.get_output_filepath("stage_timings_test")).export()
+        self.assertTrue(result.stage_timings == {})
+
+        result = PGNData(f, self.get_output_filepath("stage_timings_test")).export(timings=True)
+        moves_df = result.get_moves_df(columns=["game_id"])
+        for stage in ["read_game", "san", "fen_stats", "terminal_checks", "write_moves"]:
+            self.assertTrue(stage in result.stage_timings)
+            self.assertTrue(result.stage_timings[stage]["seconds"] > 0)
+        self.assertTrue(result.stage_timings["san"]["count"] == len(moves_df))
+        self.assertTrue(result.stage_timings["write_games"]["count"] == result.game_count)
+
+        log.info("check the timings of the workers are added together")
+        result = PGNData([f, f], self.get_output_filepath("stage_timings_workers_test")).export(workers=2,
+                                                                                                timings=True)
+        self.assertTrue(result.stage_timings["san"]["count"] == 2 * len(moves_df))
+
+        with self.assertRaises(TypeError):
+            PGNData(f).export(timings=1)
+
+    def run_progress_test(self):
+
+        log_message_title("Progress test")
+        f = self.get_source_filepath("pgn_test1.pgn")
+        progress_list = []
+        result = PGNData(f, self.get_output_filepath("progress_test")).export(progress=progress_list.append,
+                                                                            progress_interval=0.1)
+        self.assertTrue(result.is_complete)
+        self.assertTrue(len(progress_list) > 0)
+        for progress, next_progress in zip(progress_list, progress_list[1:]):
+            self.assertTrue(progress.games <= next_progress.games)
+            self.assertTrue(progress.plies <= next_progress.plies)
+        for progress in progress_list:
+            self.assertTrue(progress.games <= progress.games_read <= result.game_count)
+            self.assertTrue(progress.offset <= progress.end == os.path.getsize(f))
+            self.assertTrue(0 <= progress.fraction_done <= 1)
+            # a game can be put on the queue just before the games read are counted
+            self.assertTrue(progress.games_read - progress.games + 1 >= progress.backlog)
+
+        log.info("check the progress is only reported when a progress function or interval is given")
+        # the filter is called during the conversion, so it finds the threads running then
+        for progress_options, is_reported in [({}, False), ({"progress_interval": 10}, True),
+                                              ({"progress": progress_list.append}, True)]:
+            thread_names = set()
+            pgn_data = PGNData(f, self.get_output_filepath("progress_thread_test"))
+            pgn_data.set_game_filter(GameFilter(predicate=lambda headers: not thread_names.update(
+                thread.name for thread in threading.enumerate())))
+            pgn_data.export(**progress_options)
+            self.assertTrue(("progress reports" in thread_names) == is_reported)
+
+        log.info("check the progress reports stop when the conversion fails")
+        for moves_required in [True, False]:
+            progress_list = []
+            game_filter = GameFilter(predicate=lambda headers: 1 / (headers["White"] != "DrGrekenstein"))
+            pgn_data = PGNData(f, self.get_output_filepath("progress_error_test"))
+            pgn_data.set_game_filter(game_filter)
+            with self.assertRaises(ZeroDivisionError):
+                pgn_data.export(moves_required=moves_required, progress=progress_list.append, progress_interval=0.01)
+            report_count = len(progress_list)
+            time.sleep(0.1)
+            self.assertTrue(len(progress_list) == report_count)
+
+        log.info("check an error writing the moves is raised by the conversion")
+        with open(self.get_output_filepath("progress_error_test_game_info.csv"), mode='w') as file_games:
+            process = Process(f, file_games, FailingFile(), None, 20, True, progress_interval=0.01,
+                              progress_callback=progress_list.append)
+            with self.assertRaises(OSError):
+                process.parse_file(add_headers_flag=False)
+        report_count = len(progress_list)
+        time.sleep(0.1)
+        self.assertTrue(len(progress_list) == report_count)
+
+        with self.assertRaises(TypeError):
+            PGNData(f).export(progress="log")
+        with self.assertRaises(ValueError):
+            PGNData(f).export(progress_interval=-1)
+
+    def run_resume_test(self):
+
+        log_message_title("Resume test")
+        f = self.get_source_filepath("pgn_test1.pgn")
+        o = self.get_output_filepath("resume_test")
+        checkpoint_file = o + "_checkpoint.json"
+
+        log.info("kill an export after it has saved a checkpoint")
+        process = multiprocessing.Process(target=export_with_checkpoints, args=(f, o))
+        process.start()
+        game_order = 0
+        while game_order < 20 and process.is_alive():
+            time.sleep(0.01)
+            if os.path.isfile(checkpoint_file):
+                with open(checkpoint_file, encoding="utf-8") as file:
+                    game_order = json.load(file)["game_order"]
+        process.kill()
+        process.join()
+        self.assertTrue(os.path.isfile(checkpoint_file))
+
+        log.info("check the resumed export is the same as an export that was not stopped")
+        result = PGNData(f, o).export(resume=True)
+        self.assertTrue(result.is_complete)
+        self.assertFalse(os.path.isfile(checkpoint_file))
+        full_result = PGNData(f, self.get_output_filepath("resume_full_test")).export()
+        self.assertTrue(result.game_count == full_result.game_count)
+        self.assert_same_output(result, full_result)
+
+        log.info("check the games filtered before the checkpoint are counted in the resumed export")
+        o = self.get_output_filepath("resume_filter_test")
+        checkpoint_file = o + "_checkpoint.json"
+        process = multiprocessing.Process(target=export_with_checkpoints,
+                                          args=(f, o, GameFilter(predicate=is_not_draw)))
+        process.start()
+        game_order = 0
+        while game_order < 20 and process.is_alive():
+            time.sleep(0.01)
+            if os.path.isfile(checkpoint_file):
+                with open(checkpoint_file, encoding="utf-8") as file:
+                    game_order = json.load(file)["game_order"]
+        process.kill()
+        process.join()
+        self.assertTrue(game_order > 1)
+        pgn_data = PGNData(f, o)
+        pgn_data.set_game_filter(GameFilter(predicate=is_not_draw))
+        result = pgn_data.export(resume=True)
+        pgn_data = PGNData(f, self.get_output_filepath("resume_filter_full_test"))
+        pgn_data.set_game_filter(GameFilter(predicate=is_not_draw))
+        full_result = pgn_data.export()
+        self.assertTrue(full_result.filtered_count > 0)
+        self.assertTrue(result.filtered_count == full_result.filtered_count)
+        self.assert_same_output(result, full_result)
+
+        log.info("check the evaluation cache counters are in the statistics of the checkpoints")
+        checkpoint_statistics = []
+        engine_path = [sys.executable, os.path.join(self.folder, "engine_stub.py")]
+        with open(self.get_output_filepath("resume_engine_test_game_info.csv"), mode='w') as file_games, \
+                open(self.get_output_filepath("resume_engine_test_moves.csv"), mode='w') as file_moves:
+            process = Process(self.get_source_filepath("pgn_test2.pgn"), file_games, file_moves, engine_path, 1, True,
+                              eval_cache_path=self.get_output_filepath("resume_engine_test_cache.sqlite"),
+                              checkpoint_callback=lambda offset, order, statistics:
+                              checkpoint_statistics.append(statistics))
+            process.parse_file()
+        self.assertTrue(len(checkpoint_statistics) > 0)
+        self.assertTrue(checkpoint_statistics[-1]["eval_cache_misses"] > 0)
+
+        log.info("check there is no checkpoint when the export is not resumable")
+        o = self.get_output_filepath("resume_off_test")
+        pgn_data = PGNData([self.get_source_filepath("pgn_test2.pgn"), f], o)
+        pgn_data.set_game_filter(GameFilter(predicate=lambda headers: 1 / (headers["White"] != "DrGrekenstein")))
+        with self.assertRaises(ZeroDivisionError):
+            pgn_data.export()
+        self.assertFalse(os.path.isfile(o + "_checkpoint.json"))
+
+        with self.assertRaises(ValueError):
+            PGNData(f, o).export(resume=True, workers=2)
+
+    def run_incremental_test(self):
+
+        log_message_title("Incremental test")
+        file_a = self.get_output_filepath("incremental_a.pgn")
+        file_b = self.get_output_filepath("incremental_b.pgn")
+        with open(self.get_source_filepath("pgn_test1.pgn"), encoding="utf-8") as file:
+            games = file.read().split("\n\n\n")
+        shutil.copy(self.get_source_filepath("pgn_test2.pgn"), file_a)
+        with open(file_b, mode='w', encoding="utf-8") as file:
+            file.write("\n\n\n".join(games[:20]))
+        o = self.get_output_filepath("incremental_test")
+
+        result = PGNData([file_a, file_b], o).export(incremental=True)
+        self.assertTrue(result.game_count == 21)
+
+        log.info("check files already converted are skipped")
+        result = PGNData([file_a, file_b], o).export(incremental=True)
+        self.assertTrue(result.is_complete)
+        self.assertTrue(result.game_count == 0)
+
+        log.info("check only the games added to a file and a new file are converted")
+        with open(file_b, mode='a', encoding="utf-8") as file:
+            file.write("\n\n\n" + "\n\n\n".join(games[20:40]))
+        file_c = self.get_output_filepath("incremental_c.pgn")
+        shutil.copy(self.get_source_filepath("basic_format_test.pgn"), file_c)
+        result = PGNData([file_a, file_b, file_c], o).export(incremental=True)
+        self.assertTrue(result.game_count == 21)
+
+        log.info("check the games of a changed file are converted again")
+        shutil.copy(self.get_source_filepath("basic_format_test.pgn"), file_a)
+        result = PGNData([file_a, file_b, file_c], o).export(incremental=True)
+        self.assertTrue(result.game_count == 1)
+
+        log.info("check the output is the same as converting all the files at once")
+        full_result = PGNData([file_a, file_b, file_c], self.get_output_filepath("incremental_full_test")).export()
+        sort_columns = ["file_name", "game_order", "move_no"]
+        combined_df1 = result.get_combined_df().drop(columns=["game_id", "date_created"])
+        combined_df2 = full_result.get_combined_df().drop(columns=["game_id", "date_created"])
+        pd.testing.assert_frame_equal(combined_df1.sort_values(sort_columns).reset_index(drop=True),
+                                      combined_df2.sort_values(sort_columns).reset_index(drop=True))
+
+        with self.assertRaises(ValueError):
+            PGNData([file_a, file_b, file_c], o).export(incremental=True, collapse=True)
+
+    def run_compressed_input_test(self):
+
+        log_message_title("Compressed input test")
+        pgn_file = self.get_source_filepath("pgn_test1.pgn")
+        result = PGNData(pgn_file, self.get_output_filepath("compressed_plain_test")).export()
+        with open(pgn_file, mode='rb') as file:
+            data = file.read()
+        for extension, module in [("gz", gzip), ("bz2", bz2), ("xz", lzma)]:
+            log.info("check a {} file gives the same output as the pgn file".format(extension))
+            compressed_file = self.get_output_filepath("pgn_test1.pgn." + extension)
+            with module.open(compressed_file, mode='wb') as file:
+                file.write(data)
+            compressed_result = PGNData(compressed_file, self.get_output_filepath(
+                "compressed_{}_test".format(extension))).export()
+            self.assertTrue(compressed_result.is_complete)
+            self.assertTrue(os.path.isfile(self.get_output_filepath("compressed_{}_test_game_info.csv"
+                                                                    .format(extension))))
+            self.assert_same_output(result, compressed_result)
+
+        log.info("check compressed files are converted by the parallel workers")
+        compressed_file = self.get_output_filepath("pgn_test1.pgn.gz")
+        parallel_result = PGNData([compressed_file, pgn_file],
+                                  self.get_output_filepath("compressed_parallel_test")).export(workers=2)
+        self.assertTrue(parallel_result.game_count == 2 * result.game_count)
+
+    def run_compressed_output_test(self):
+
+        log_message_title("Compressed output test")
+        pgn_file = self.get_source_filepath("pgn_test1.pgn")
+        result = PGNData(pgn_file, self.get_output_filepath("compressed_output_plain_test")).export(collapse=True)
+        for compression, extension in [("gzip", "gz"), ("bz2", "bz2"), ("xz", "xz")]:
+            log.info("check the {} files are read back the same as the csv files".format(compression))
+            pgn_data = PGNData(pgn_file, self.get_output_filepath("compressed_output_{}_test".format(compression)))
+            pgn_data.set_buffer_size(64 * 1024)
+            compressed_result = pgn_data.export(collapse=True, compression=compression)
+            self.assertTrue(compressed_result.is_complete)
+            self.assertTrue(compressed_result.moves_file.name.endswith("_moves.csv." + extension))
+            self.assertTrue(compressed_result.moves_file.size < result.moves_file.size)
+            self.assert_same_output(result, compressed_result)
+
+        log.info("check the parts of the workers are merged into the compressed files")
+        parallel_result = PGNData([pgn_file, pgn_file], self.get_output_filepath(
+            "compressed_output_parallel_test")).export(workers=2, compression="gzip")
+        self.assertTrue(len(parallel_result.get_moves_df()) == 2 * len(result.get_moves_df()))
+
+        with self.assertRaises(ValueError):
+            PGNData(pgn_file).export(compression="zip")
+        with self.assertRaises(ValueError):
+            PGNData(pgn_file).export(compression="gzip", resume=True)
+
+    def run_game_filter_test(self):
+
+        log_message_title("Game filter test")
+        pgn_file = self.get_source_filepath("pgn_test1.pgn")
+        full_result = PGNData(pgn_file, self.get_output_filepath("game_filter_all_test")).export()
+        games_df = full_result.get_games_df()
+        moves_df = full_result.get_moves_df()
+
+        log.info("check only the games selected by the filter are converted, with their game order in the file")
+        pgn_data = PGNData(pgn_file, self.get_output_filepath("game_filter_test"))
+        pgn_data.set_game_filter(GameFilter(min_elo=1500, speeds=["blitz"], predicate=is_not_draw))
+        result = pgn_data.export()
+        selected_df = games_df[(games_df["white_elo"] >= 1500) & (games_df["black_elo"] >= 1500) &
+                               (games_df["time_control"].map(get_speed) == "blitz") & (games_df["result"] != "1/2-1/2")]
+        self.assertTrue(0 < len(selected_df) < len(games_df))
+        self.assertTrue(result.game_count == len(games_df))
+        self.assertTrue(result.filtered_count == len(games_df) - len(selected_df))
+        self.assertTrue(result.get_games_df()["game_order"].tolist() == selected_df["game_order"].tolist())
+        self.assertTrue(len(result.get_moves_df()) == moves_df["game_id"].isin(selected_df["game_id"]).sum())
+
+        log.info("check the filter is used when only the games are converted, and by the workers")
+        games_result = pgn_data.export(moves_required=False)
+        self.assertTrue(games_result.get_games_df()["game_order"].tolist() == selected_df["game_order"].tolist())
+        parallel_result = pgn_data.export(workers=2)
+        self.assertTrue(parallel_result.get_games_df()["game_order"].tolist() == selected_df["game_order"].tolist())
+
+        log.info("check the other conditions of the filter")
+        self.assertTrue(GameFilter(time_controls=["60+0"], events=["titled arena"]).is_match(
+            {"TimeControl": "60+0", "Event": "Titled Arena April '21"}))
+        self.assertFalse(GameFilter(start_date="2021.04.01", end_date="2021.04.30").is_match({"Date": "2021.05.01"}))
+        self.assertFalse(GameFilter(start_date="2021.04.01").is_match({"Date": "????.??.??"}))
+        log.info("check the UTCDate is used for a game that has no Date")
+        game = chess.pgn.read_game(io.StringIO('[UTCDate "2021.04.15"]\n\n1. e4 e5 *\n'))
+        self.assertTrue(game.headers["Date"] == "????.??.??")
+        self.assertTrue(GameFilter(start_date="2021.04.01", end_date="2021.04.30").is_match(game.headers))
+        self.assertFalse(GameFilter(start_date="2021.05.01").is_match(game.headers))
+        self.assertTrue(GameFilter(variants=["standard"], players=["DrNykterstein"]).is_match(
+            {"White": "Someone", "Black": "DrNykterstein"}))
+        self.assertFalse(GameFilter(max_elo=2000).is_match({"WhiteElo": "1900", "BlackElo": "?"}))
+        with self.assertRaises(ValueError):
+            GameFilter(speeds=["fast"])
+
+    def run_move_columns_test(self):
+
+        log_message_title("Move columns test")
+        pgn_file = self.get_source_filepath("pgn_test1.pgn")
+        moves_df = PGNData(pgn_file, self.get_output_filepath("move_columns_all_test")).export().get_moves_df()
+        columns = ["fen_row3_black_value", "move_no", "notation", "is_game_over", "captured_score_for_white"]
+        for move_sequence in ["full", "last"]:
+            log.info("check only the selected columns are created with move_sequence {}".format(move_sequence))
+            result = PGNData(pgn_file, self.get_output_filepath("move_columns_test")).export(
+                columns=columns + ["move_sequence"], move_sequence=move_sequence)
+            selected_df = result.get_moves_df()
+            self.assertTrue(list(selected_df.columns) == ["game_id", "move_no", "notation", "is_game_over",
+                                                          "captured_score_for_white", "fen_row3_black_value",
+                                                          "move_sequence"])
+            expected_df = moves_df if move_sequence == "full" else PGNData(pgn_file, self.get_output_filepath(
+                "move_columns_last_test")).export(move_sequence="last").get_moves_df()
+            pd.testing.assert_frame_equal(selected_df.drop(columns=["game_id"]),
+                                          expected_df[selected_df.columns].drop(columns=["game_id"]),
+                                          check_categorical=False)
+
+        with self.assertRaises(ValueError):
+            PGNData(pgn_file).export(columns=["move_no", "not_a_column"])
+        with self.assertRaises(ValueError):
+            PGNData(pgn_file).export(columns=["move_no"], moves_required=False)
+
+    def run_game_id_test(self):
+
+        log_message_title("Game id test")
+        pgn_file = self.get_source_filepath("pgn_test1.pgn")
+        pgn_data = PGNData(pgn_file, self.get_output_filepath("game_id_test"))
+        pgn_data.set_game_id_type("int")
+        result = pgn_data.export()
+        games_df = result.get_games_df()
+        moves_df = result.get_moves_df()
+        self.assertTrue(games_df["game_id"].dtype == "int64")
+        self.assertTrue(games_df["game_id"].is_unique)
+        self.assertTrue(moves_df["game_id"].isin(games_df["game_id"]).all())
+
+        log.info("check the game ids are the same when the file is exported again, and when it is split in parts")
+        self.assertTrue(pgn_data.export().get_games_df()["game_id"].tolist() == games_df["game_id"].tolist())
+        pgn_data.set_split_size(20000)
+        parallel_result = pgn_data.export(workers=3)
+        self.assertTrue(parallel_result.get_games_df()["game_id"].tolist() == games_df["game_id"].tolist())
+        self.assertTrue(parallel_result.get_moves_df()["game_id"].tolist() == moves_df["game_id"].tolist())
+
+        log.info("check the games of files with the same name in different folders have different ids")
+        folder = self.get_output_filepath("game_id_folders")
+        pgn_files = []
+        for sub_folder in ["a", "b"]:
+            os.makedirs(os.path.join(folder, sub_folder), exist_ok=True)
+            pgn_files.append(shutil.copy(pgn_file, os.path.join(folder, sub_folder, "games.pgn")))
+        folders_data = PGNData(pgn_files, self.get_output_filepath("game_id_folders_test"))
+        folders_data.set_game_id_type("int")
+        folders_games_df = folders_data.export(moves_required=False).get_games_df()
+        self.assertTrue(len(folders_games_df) == 2 * len(games_df))
+        self.assertTrue(folders_games_df["game_id"].is_unique)
+        shutil.rmtree(folder)
+
+        log.info("check the games of a file listed twice have different ids, also when it is split in parts")
+        twice_data = PGNData([pgn_file, pgn_file], self.get_output_filepath("game_id_twice_test"))
+        twice_data.set_game_id_type("int")
+        twice_result = twice_data.export()
+        twice_games_df = twice_result.get_games_df()
+        self.assertTrue(len(twice_games_df) == 2 * len(games_df))
+        self.assertTrue(twice_games_df["game_id"].is_unique)
+        self.assertTrue(twice_games_df["game_id"].head(len(games_df)).tolist() == games_df["game_id"].tolist())
+        self.assertTrue(len(twice_result.get_combined_df()) == 2 * len(moves_df))
+        twice_data.set_split_size(20000)
+        self.assertTrue(twice_data.export(workers=3).get_games_df()["game_id"].tolist() ==
+                        twice_games_df["game_id"].tolist())
+
+        log.info("check the moves file is smaller than with uuids")
+        uuid_result = PGNData(pgn_file, self.get_output_filepath("game_id_uuid_test")).export()
+        self.assertTrue(result.moves_file.size < uuid_result.moves_file.size)
+
+    def run_positions_test(self):
+
+        log_message_title("Positions test")
+        pgn_file = self.get_source_filepath("pgn_test1.pgn")
+        result = PGNData(pgn_file, self.get_output_filepath("positions_all_columns_test")).export()
+        pgn_data = PGNData(pgn_file, self.get_output_filepath("positions_test"))
+        positions_result = pgn_data.export(positions=True)
+        self.assertTrue(positions_result.is_complete)
+        positions_df = positions_result.get_positions_df()
+        moves_df = positions_result.get_moves_df()
+        self.assertTrue(positions_df["position_id"].is_unique)
+        self.assertTrue(positions_result.position_count == len(positions_df))
+        self.assertTrue(len(positions_df) < len(moves_df))
+        self.assertTrue("fen" not in moves_df.columns and "white_count" not in moves_df.columns)
+
+        log.info("check the moves joined with their positions are the same as the moves file with all the columns")
+        all_moves_df = result.get_moves_df()
+        joined_df = pd.merge(moves_df, positions_df, on="position_id", how="left")[list(all_moves_df.columns)]
+        pd.testing.assert_frame_equal(joined_df.drop(columns=["game_id"]), all_moves_df.drop(columns=["game_id"]),
+                                      check_categorical=False)
+
+        log.info("check each position is written once when the file is split in parts")
+        pgn_data.set_split_size(20000)
+        parallel_result = pgn_data.export(positions=True, workers=3)
+        parallel_positions_df = parallel_result.get_positions_df()
+        self.assertTrue(parallel_positions_df["position_id"].is_unique)
+        self.assertTrue(sorted(parallel_positions_df["position_id"]) == sorted(positions_df["position_id"]))
+        self.assertTrue(parallel_result.get_moves_df()["position_id"].tolist() == moves_df["position_id"].tolist())
+
+        log.info("check the combined file has the columns of the positions, the same as the combined dataframe")
+        combined_df = positions_result.get_combined_df()
+        combined_file = self.get_output_filepath("positions_test_combined.csv")
+        self.assertTrue(positions_result.create_combined_file(combined_file, chunksize=1000))
+        combined_file_df = pd.read_csv(combined_file)
+        self.assertTrue(list(combined_file_df.columns) == list(combined_df.columns))
+        self.assertTrue(combined_file_df["fen"].tolist() == combined_df["fen"].tolist())
+        self.assertTrue(combined_file_df["white_count"].tolist() == combined_df["white_count"].tolist())
+        chunked_df = pd.concat(positions_result.iter_combined_df(chunksize=1000), ignore_index=True)
+        self.assertTrue(list(chunked_df.columns) == list(combined_df.columns))
+
+        log.info("check positions can not be used with resume")
+        with self.assertRaises(ValueError):
+            pgn_data.export(positions=True, resume=True)
+
+    def run_game_index_test(self):
+
+        log_message_title("Game index test")
+        pgn_file = self.get_source_filepath("pgn_test1.pgn")
+        pgn_data = PGNData(pgn_file, self.get_output_filepath("game_index_test"))
+        pgn_data.set_game_id_type("int")
+        result = pgn_data.export(index=True)
+        self.assertTrue(result.is_complete)
+        moves_df = result.get_moves_df(columns=["game_id", "move_no", "move_sequence", "fen"])
+
+        log.info("check the games found by their first moves are the games with the same move sequence")
+        for moves in ["e4", "e4|c5", "d4|Nf6|c4"]:
+            expected_ids = moves_df[(moves_df["move_no"] == len(moves.split("|"))) &
+                                    (moves_df["move_sequence"] == moves)]["game_id"].tolist()
+            self.assertTrue(len(expected_ids) > 0)
+            self.assertTrue(result.get_games_by_moves(moves) == expected_ids)
+        self.assertTrue(result.get_games_by_moves(["e2e4", "c7c5"]) == result.get_games_by_moves(["e4", "c5"]))
+
+        log.info("check the games found by a position are the games with the position in their first moves")
+        fen = moves_df["fen"].iloc[5]
+        expected_ids = moves_df[(moves_df["move_no"] <= DEFAULT_INDEX_DEPTH) &
+                                (moves_df["fen"] == fen)]["game_id"].drop_duplicates().tolist()
+        self.assertTrue(result.get_games_by_position(fen) == expected_ids)
+
+        log.info("check the index is the same when the file is split in parts")
+        pgn_data.set_split_size(20000)
+        parallel_result = pgn_data.export(index=True, workers=3)
+        self.assertTrue(parallel_result.get_games_by_moves("e4|c5") == result.get_games_by_moves("e4|c5"))
+        self.assertTrue(parallel_result.get_games_by_position(fen) == expected_ids)
+
+        log.info("check moves that are not legal or deeper than the index are not accepted")
+        with self.assertRaises(ValueError):
+            result.get_games_by_moves(["e5"])
+        with self.assertRaises(ValueError):
+            result.get_games_by_moves(["Nf3", "Nf6", "Ng1", "Ng8"] * 5)
+
+    def run_benchmark_corpus_test(self):
+
+        log_message_title("Benchmark corpus test")
+        pgn_file = self.get_output_filepath("benchmark_corpus.pgn")
+        games, plies = generate_pgn(pgn_file, 20, with_comments=True, with_clocks=True)
+        with open(pgn_file, encoding="utf-8") as file:
+            content = file.read()
+
+        log.info("check the same corpus is generated every time")
+        generate_pgn(pgn_file, 20, with_comments=True, with_clocks=True)
+        with open(pgn_file, encoding="utf-8") as file:
+            self.assertTrue(file.read() == content)
+
+        log.info("check the corpus can be converted")
+        result = PGNData(pgn_file, self.get_output_filepath("benchmark_corpus")).export()
+        self.assertTrue(result.is_complete)
+        self.assertTrue(result.game_count == games)
+        self.assertTrue(len(result.get_moves_df(columns=["game_id"])) == plies)
+
+        log.info("check results slower than the baseline are reported")
+        baseline = {"results": [{"corpus": "c", "mode": "moves", "games_per_second": 100.0, "peak_rss_mb": 100.0,
+                                 "output_bytes": 1000}]}
+        report = {"results": [dict(baseline["results"][0], games_per_second=95.0)]}
+        self.assertTrue(len(compare_to_baseline(report, baseline)) == 0)
+        report = {"results": [dict(baseline["results"][0], games_per_second=50.0, peak_rss_mb=200.0)]}
+        self.assertTrue(len(compare_to_baseline(report, baseline)) == 2)
+
+    def assert_same_output(self, result1, result2):
+        """
+        compares two exports, ignoring the generated game ids and creation dates
+        """
+        games_df1, games_df2 = result1.get_games_df(), result2.get_games_df()
+        moves_df1, moves_df2 = result1.get_moves_df(), result2.get_moves_df()
+        ignore_games = ["game_id", "date_created"]
+        pd.testing.assert_frame_equal(games_df1.drop(columns=ignore_games), games_df2.drop(columns=ignore_games))
+        pd.testing.assert_frame_equal(moves_df1.drop(columns=["game_id"]), moves_df2.drop(columns=["game_id"]))
+
+        log.info("check the moves map to the same games")
+        move_ids1 = moves_df1["game_id"].map({k: v for v, k in enumerate(games_df1["game_id"])})
+        move_ids2 = moves_df2["game_id"].map({k: v for v, k in enumerate(games_df2["game_id"])})
+        self.assertTrue(move_ids1.tolist() == move_ids2.tolist())
+
     def run_reported_github_issues_test(self):
 
         """
@@ -381,6 +1214,18 @@ class FileCreationTestCase(unittest.TestCase):
         log.info("check correct number of rows in combined df")
         self.assertTrue(len(moves_df) == len(combined_df))
 
+        log.info("check the columns are loaded with the types of the headers")
+        self.assertTrue(str(games_df["white_elo"].dtype) == "Int16")
+        self.assertTrue(str(games_df["white"].dtype) == "category")
+        self.assertTrue(str(moves_df["is_check"].dtype) == "boolean")
+        self.assertTrue(str(moves_df["white_count"].dtype) == "Int8")
+
+        log.info("check only the selected columns are loaded")
+        selected_df = result.get_moves_df(columns=["game_id", "piece", "is_check"])
+        self.assertTrue(list(selected_df.columns) == ["game_id", "piece", "is_check"])
+        self.assertTrue(len(selected_df) == len(moves_df))
+        self.assertTrue(result.get_games_df(columns=["not_a_column"]) is None)
+
         log.info("perform basic pandas operation")
         self.assertTrue(len(moves_df.head(3)) == 3)
         self.assertTrue(len(games_df.head(1)) == 1)
@@ -396,6 +1241,26 @@ class FileCreationTestCase(unittest.TestCase):
         self.assertTrue(os.path.exists(combined_file2))
         self.assertTrue(is_exists)
 
+        log.info("check combined dataframe in chunks is the same as the combined dataframe")
+        chunks = list(result.iter_combined_df(chunksize=100))
+        self.assertTrue(len(chunks) > 1)
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        chunked_df = pd.concat(chunks, ignore_index=True)
+        self.assertTrue(list(chunked_df.columns) == list(combined_df.columns))
+        self.assertTrue(chunked_df["game_id"].tolist() == combined_df["game_id"].tolist())
+        self.assertTrue(chunked_df["move_no"].tolist() == combined_df["move_no"].tolist())
+
+        combined_file3 = self.get_output_filepath("pandas_test_export3.csv")
+        self.assertTrue(result.create_combined_file(combined_file3, chunksize=100))
+        self.assertTrue(len(pd.read_csv(combined_file3)) == len(combined_df))
+
+        log.info("check the combined file has the values of the games and moves files, with 0 or 1 in the is_ columns")
+        combined_text_df = pd.read_csv(combined_file3, dtype=str, keep_default_na=False)
+        expected_df = pd.merge(pd.read_csv(result.games_file.name, dtype=str, keep_default_na=False),
+                               pd.read_csv(result.moves_file.name, dtype=str, keep_default_na=False), on="game_id")
+        pd.testing.assert_frame_equal(combined_text_df, expected_df)
+        self.assertTrue(set(combined_text_df["is_check"]) <= {"0", "1"})
+
         log_message_title("test pandas dataframe when games only")
         f = self.get_source_filepath("pandas_test.pgn")
         o = self.get_output_filepath("pandas_games_only_dataframe_test")
@@ -415,6 +1280,27 @@ class FileCreationTestCase(unittest.TestCase):
         del combined_df
 
 
+def export_with_checkpoints(pgn_file, output_file, game_filter=None):
+    pgn_data = PGNData(pgn_file, output_file)
+    if game_filter is not None:
+        pgn_data.set_game_filter(game_filter)
+    pgn_data.set_checkpoint_interval(0.01)
+    pgn_data.export(progress_interval=0)
+
+
+class FailingFile:
+    """
+    file that can not be written to, like a full disk
+    """
+
+    def write(self, text):
+        raise OSError("No space left on device")
+
+
+def is_not_draw(headers):
+    return headers.get("Result") != "1/2-1/2"
+
+
 def board_test():
     test_board_ref = BoardRefTestCase()
     test_board_ref.run_piece_at_square_test()
@@ -423,6 +1309,13 @@ def board_test():
 def fen_stat_tests():
     test_fen = FenTestCase()
     test_fen.run_test()
+    test_fen.run_board_test()
+    test_fen.run_row_cache_test()
+
+
+def game_state_tests():
+    test_game_state = GameStateTestCase()
+    test_game_state.run_test()
 
 
 def file_creation_tests():
@@ -456,6 +1349,7 @@ def run_all_tests():
     log_output_as_headline("Start testing")
     board_test()
     fen_stat_tests()
+    game_state_tests()
     file_creation_tests()
     log_output_as_headline("end testing")
     t.print_time_taken()